@@ -0,0 +1,11 @@
+"""
+Benchmarks for pyccd, timing ccd.detect and the internals it spends most of
+its time in.
+
+Run from the root of the repository:
+
+    python -m benchmarks [--quick] [--save results.json]
+                         [--compare baseline.json]
+
+See benchmarks/__main__.py for the options.
+"""
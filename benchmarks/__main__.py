@@ -0,0 +1,247 @@
+"""
+Run the benchmarks and report per call latency, throughput and how each
+benchmark scales with the number of observations.
+
+    python -m benchmarks                  all sizes, 100 to 5000 observations
+    python -m benchmarks --quick          fewer sizes and less time per size
+    python -m benchmarks --only detect    benchmarks whose name contains detect
+    python -m benchmarks --save out.json  keep the timings
+    python -m benchmarks --compare base.json
+                                          flag anything slower than the saved
+                                          timings, exiting with 1 if so
+    python -m benchmarks --chip out/chip --workers 4
+                                          pixels per second across a chip
+                                          from benchmarks.synthetic, instead
+                                          of the other benchmarks
+
+The scaling exponent is the slope of log(time) against log(observations), 1
+being linear. Timings are the fastest of several repeats, which is the least
+affected by whatever else is running on the machine.
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import timeit
+import warnings
+
+import numpy as np
+
+import ccd
+from benchmarks import cases
+
+
+def measure(func, min_time, repeat=5):
+    """
+    Time a function, calling it enough times in each repeat to take at least
+    min_time seconds.
+
+    Args:
+        func: function taking no arguments
+        min_time: minimum seconds for each repeat
+        repeat: number of repeats
+
+    Returns:
+        float: fastest seconds per call
+    """
+    timer = timeit.Timer(func)
+
+    # Warm up any caches, such as the QA lookup table or the design matrix of
+    # the acquisition dates, the same way repeated calls across a tile would.
+    func()
+
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1000:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    times = [elapsed] + timer.repeat(repeat=repeat - 1, number=number)
+
+    return min(times) / number
+
+
+def exponent(sizes, seconds):
+    """
+    Slope of log(seconds) against log(sizes).
+
+    Args:
+        sizes: sequence of observation counts
+        seconds: matching sequence of seconds per call
+
+    Returns:
+        float
+    """
+    return float(np.polyfit(np.log(sizes), np.log(seconds), 1)[0])
+
+
+def run(sizes, min_time, only=None):
+    """
+    Run every benchmark.
+
+    Args:
+        sizes: observation counts for the synthetic series
+        min_time: minimum seconds for each timing repeat
+        only: optional substring the benchmark names must contain
+
+    Returns:
+        dict: {'pixels': {name: {...}}, 'scaling': {name: {...}}}
+    """
+    results = {'pixels': {}, 'scaling': {}}
+
+    if only is None or only in 'detect':
+        for name, count, func in cases.pixels():
+            seconds = measure(func, min_time)
+            results['pixels'][name] = {'observations': count,
+                                       'seconds': seconds,
+                                       'per_second': 1 / seconds}
+            report_pixel(name, results['pixels'][name])
+
+    for name, make in cases.SCALING:
+        if only is not None and only not in name:
+            continue
+
+        seconds = [measure(make(size), min_time) for size in sizes]
+        results['scaling'][name] = {'sizes': list(sizes),
+                                    'seconds': seconds,
+                                    'exponent': exponent(sizes, seconds)}
+        report_scaling(name, results['scaling'][name])
+
+    return results
+
+
+def report_pixel(name, result):
+    print('{:<45} {:>6} obs {:>10.2f} ms {:>8.1f} px/s'.format(
+        name, result['observations'], result['seconds'] * 1000,
+        result['per_second']))
+
+
+def report_scaling(name, result):
+    timings = ' '.join('{}:{:.3f}ms'.format(size, seconds * 1000)
+                       for size, seconds in zip(result['sizes'],
+                                                result['seconds']))
+    print('{:<22} n^{:<5.2f} {}'.format(name, result['exponent'], timings))
+
+
+def run_chip(path, pixels, workers, chunk_size):
+    """
+    Run detection across a synthetic chip once, as a load test of the
+    block and process pool runners.
+
+    Returns:
+        dict: {'chip': {...}}
+    """
+    count, func = cases.chip_runner(path, pixels, workers, chunk_size)
+
+    start = timeit.default_timer()
+    func()
+    seconds = timeit.default_timer() - start
+
+    result = {'path': path, 'pixels': count, 'workers': workers,
+              'seconds': seconds, 'per_second': count / seconds}
+
+    print('{} {} pixels, {} workers: {:.1f} s {:.1f} px/s'.format(
+        path, count, 'default' if workers is None else workers, seconds,
+        result['per_second']))
+
+    return {'chip': result}
+
+
+def compare(results, baseline, threshold):
+    """
+    Find everything that got slower than the baseline by more than the
+    threshold.
+
+    Args:
+        results: results from run
+        baseline: results from an earlier run
+        threshold: ratio of new to old seconds that counts as a regression
+
+    Returns:
+        list of (name, old seconds, new seconds)
+    """
+    slower = []
+
+    for name, result in results.get('pixels', {}).items():
+        old = baseline.get('pixels', {}).get(name)
+        if old and result['seconds'] > threshold * old['seconds']:
+            slower.append((name, old['seconds'], result['seconds']))
+
+    for name, result in results.get('scaling', {}).items():
+        old = baseline.get('scaling', {}).get(name)
+        if not old:
+            continue
+
+        previous = dict(zip(old['sizes'], old['seconds']))
+        for size, seconds in zip(result['sizes'], result['seconds']):
+            if size in previous and seconds > threshold * previous[size]:
+                slower.append(('{} n={}'.format(name, size),
+                               previous[size], seconds))
+
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='pyccd benchmarks')
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer sizes and less time per size')
+    parser.add_argument('--only', help='only run benchmarks containing this')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help='observation counts for the synthetic series')
+    parser.add_argument('--save', help='write the results to a json file')
+    parser.add_argument('--compare', help='json file of earlier results')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio counted as a regression')
+    parser.add_argument('--chip', help='directory of a synthetic chip to run')
+    parser.add_argument('--pixels', type=int,
+                        help='number of pixels of the chip to run')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes for the chip, 0 for none')
+    parser.add_argument('--chunk-size', type=int, default=100,
+                        help='pixels handed to a worker at a time')
+    args = parser.parse_args(argv)
+
+    # The detection logs at debug level throughout
+    logging.getLogger('ccd').setLevel(logging.WARNING)
+    warnings.simplefilter('ignore')
+
+    sizes = args.sizes or (cases.QUICK_SIZES if args.quick else cases.SIZES)
+    min_time = 0.05 if args.quick else 0.2
+
+    print('pyccd {} numpy {} python {}'.format(ccd.__version,
+                                               np.__version__,
+                                               platform.python_version()))
+
+    if args.chip:
+        results = run_chip(args.chip, args.pixels, args.workers,
+                           args.chunk_size)
+    else:
+        results = run(sizes, min_time, args.only)
+
+    results['versions'] = {'pyccd': ccd.__version,
+                           'numpy': np.__version__,
+                           'python': platform.python_version()}
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(results, json.load(f), args.threshold)
+
+        for name, old, new in slower:
+            print('SLOWER {}: {:.3f}ms -> {:.3f}ms'
+                  .format(name, old * 1000, new * 1000))
+
+        if slower:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
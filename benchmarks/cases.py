@@ -0,0 +1,212 @@
+"""
+What gets timed.
+
+Each case takes the number of observations and returns a function with no
+arguments to time. Anything that should not be timed, like generating the
+data or building the parameters, is done up front.
+"""
+import glob
+import itertools
+import os
+
+import numpy as np
+
+import ccd
+from ccd import app
+from ccd import parallel
+from ccd import indices
+from ccd import qa
+from ccd import reader
+from ccd.change import MaskedObservations
+from ccd.math_utils import adjusted_variogram
+from ccd.math_utils import kelvin_to_celsius
+from ccd.models import fitters
+from ccd.models import lasso
+from ccd.models import tmask
+from ccd.procedures import lookforward
+
+from benchmarks import synthetic
+
+RESOURCES = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                         'test', 'resources')
+
+SIZES = (100, 250, 500, 1000, 2500, 5000)
+QUICK_SIZES = (100, 500, 1000)
+
+
+def __clear(pixel):
+    """
+    Dates and all 14 bands of the clear observations, with the thermal
+    converted to celsius, as the procedures see them.
+    """
+    params = app.get_default_params()
+    qas = qa.unpackqa(pixel['qas'], params)
+    clear = qas == params.QA_CLEAR
+
+    observations = np.array([pixel[b] for b in synthetic.BANDS],
+                            dtype=float)[:, clear]
+    observations = indices.append_indices(observations,
+                                          np.ones(np.sum(clear), dtype=bool),
+                                          params)
+    observations[params.THERMAL_IDX] = kelvin_to_celsius(
+        observations[params.THERMAL_IDX])
+
+    return pixel['dates'][clear], observations
+
+
+def detect(count):
+    pixel = synthetic.series(count)
+
+    return lambda: ccd.detect(**pixel)
+
+
+def __sliding(count):
+    """
+    Windows of count clear observations, each one starting an observation
+    later than the last, the way lookforward and lookback move through a
+    series. Fitting the same dates every call would flatter anything that
+    caches on them.
+
+    Returns:
+        dates, observations and an endless iterator of the windows
+    """
+    dates, observations = __clear(synthetic.series(count + 100))
+    slides = max(dates.shape[0] - count, 1)
+
+    return dates, observations, itertools.cycle(
+        [slice(start, start + count) for start in range(slides)])
+
+
+def fitted_model(count):
+    dates, observations, windows = __sliding(count)
+
+    def run():
+        window = next(windows)
+        return lasso.fitted_model(dates[window], observations[1, window],
+                                  1000, synthetic.AVG_DAYS_YR, 8)
+
+    return run
+
+
+def fitted_models(count):
+    dates, observations, windows = __sliding(count)
+
+    def run():
+        window = next(windows)
+        return lasso.fitted_models(dates[window], observations[:, window],
+                                   1000, synthetic.AVG_DAYS_YR, 8)
+
+    return run
+
+
+def tmask_fit(count):
+    params = app.get_default_params()
+    dates, observations = __clear(synthetic.series(count, breaks=0))
+    variogram = adjusted_variogram(dates, observations)
+
+    return lambda: tmask.tmask(dates, observations, variogram,
+                               params.TMASK_BANDS, params.T_CONST,
+                               params.AVG_DAYS_YR)
+
+
+def variogram(count):
+    dates, observations = __clear(synthetic.series(count))
+
+    return lambda: adjusted_variogram(dates, observations)
+
+
+def unpackqa(count):
+    params = app.get_default_params()
+    qas = synthetic.series(count)['qas']
+
+    return lambda: qa.unpackqa(qas, params)
+
+
+def unpackqa_lut(count):
+    params = app.get_default_params()
+    qas = synthetic.series(count)['qas']
+
+    return lambda: qa.unpackqa_lut(qas, params)
+
+
+def lookforward_fit(count):
+    """
+    Extend a single segment from its first year to the end of a series with
+    no breaks, the masked observations being rebuilt for each run as
+    lookforward masks outliers out of them.
+    """
+    params = app.get_default_params()
+    dates, observations = __clear(synthetic.series(count, breaks=0))
+    variogram = adjusted_variogram(dates, observations)
+    mask = np.ones(dates.shape[0], dtype=bool)
+    fitter_fn = fitters.resolve(params.FITTER_FN)
+
+    window = slice(0, int(np.searchsorted(dates, dates[0] + 365)) + 1)
+
+    def run():
+        masked = MaskedObservations(dates, observations, mask)
+        return lookforward(masked, window, fitter_fn, variogram,
+                           app.Parameters(params))
+
+    return run
+
+
+# Benchmarks run over synthetic series of each size, in order of how much of
+# detect they cover
+SCALING = (('detect', detect),
+           ('lookforward', lookforward_fit),
+           ('lasso.fitted_models', fitted_models),
+           ('lasso.fitted_model', fitted_model),
+           ('tmask.tmask', tmask_fit),
+           ('adjusted_variogram', variogram),
+           ('qa.unpackqa', unpackqa),
+           ('qa.unpackqa_lut', unpackqa_lut))
+
+
+def pixels():
+    """
+    ccd.detect over each of the bundled pixels.
+
+    Returns:
+        list of (name, number of observations, function to time)
+    """
+    cases = []
+    for path in sorted(glob.glob(os.path.join(RESOURCES, '*.npy'))):
+        pixel = dict(np.load(path, allow_pickle=True)[1])
+        name = os.path.splitext(os.path.basename(path))[0]
+
+        cases.append((name, len(pixel['dates']),
+                      lambda pixel=pixel: ccd.detect(**pixel)))
+
+    return cases
+
+
+def chip_runner(path, pixels=None, workers=None, chunk_size=100):
+    """
+    ccd.parallel.detect_tile, or ccd.detect_block a block at a time when
+    workers is 0, over a chip written by benchmarks.synthetic.chip. The chip
+    is memory mapped with ccd.reader rather than loaded.
+
+    Args:
+        path: directory the chip was written to
+        pixels: number of pixels to run, defaults to all of them
+        workers: number of worker processes, 0 to run in this process
+        chunk_size: number of pixels handed to a worker at a time
+
+    Returns:
+        int: number of pixels
+        function to time
+    """
+    cube = reader.open_npy(path, readahead=True)
+    spectra, qas = cube.block(slice(0, pixels))
+
+    if workers == 0:
+        return qas.shape[1], lambda: list(cube.detect(chunk_size=chunk_size,
+                                                      stop=pixels))
+
+    def run():
+        return list(parallel.detect_tile(cube.dates, spectra, qas,
+                                         chunk_size=chunk_size,
+                                         workers=workers))
+
+    return qas.shape[1], run
@@ -0,0 +1,442 @@
+"""
+Synthetic Landsat-like time series, so the benchmarks can run at any number
+of observations without real data.
+
+series gives a single pixel in memory. chip writes a full chip of pixels
+sharing the same acquisition dates to .npy files that can be memory mapped,
+for load testing ccd.detect_block and ccd.parallel.detect_tile:
+
+    python -m benchmarks.synthetic out/chip --rows 100 --cols 100
+
+Everything is drawn from seeded numpy RandomStates, the same arguments
+always give the same data.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+# 1982-01-01, around the start of the Landsat 4 record
+START_ORDINAL = 723546
+
+# Days between acquisitions. Overlapping paths give same and next day
+# acquisitions, two sensors in orbit give 8 days, one gives 16.
+GAPS = np.array([1, 1, 7, 8, 8, 9, 16, 16, 32])
+
+BANDS = ('blues', 'greens', 'reds', 'nirs', 'swir1s', 'swir2s', 'thermals')
+
+# Mean, seasonal amplitude and noise for each of the BANDS, in the same
+# scaled units as ARD, reflectance * 10000 and brightness temperature in
+# kelvin * 10
+LEVELS = np.array([500, 750, 700, 2500, 1800, 1000, 2900])
+AMPLITUDES = np.array([100, 150, 200, 600, 300, 200, 150])
+NOISE = np.array([40, 40, 50, 100, 80, 60, 30])
+
+# Bit-packed ARD QA values
+QA_FILL = 1
+QA_CLEAR = 66
+QA_WATER = 68
+QA_SHADOW = 72
+QA_SNOW = 80
+QA_CLOUD = 224
+
+AVG_DAYS_YR = 365.2425
+
+# Landsat 7 on orbit, alongside Landsat 5 until it stopped imaging and then
+# Landsat 8 once it started
+LE07_START = 729859
+LT05_STOP = 734459
+LC08_START = 734969
+
+# Landsat 7 scan line corrector failure, leaving wedge shaped gaps across
+# every scene after
+SLC_OFF = 731366
+
+# Pixels between the start of each SLC-off gap, and how wide the gaps are,
+# leaving about 22% of each scene unfilled
+SLC_PERIOD = 32
+SLC_WIDTH = 7
+
+
+def acquisition_dates(count, rng):
+    """
+    Irregular acquisition dates.
+
+    Args:
+        count: number of acquisitions
+        rng: numpy RandomState
+
+    Returns:
+        1-d int64 ndarray of ordinal dates, in order
+    """
+    gaps = rng.choice(GAPS, size=count)
+    gaps[0] = 0
+
+    return START_ORDINAL + np.cumsum(gaps, dtype=np.int64)
+
+
+def spectra(dates, rng, breaks=0):
+    """
+    Seasonal signal for each band, with abrupt changes in level at evenly
+    spaced break dates.
+
+    Args:
+        dates: 1-d ndarray of ordinal dates
+        rng: numpy RandomState
+        breaks: number of breaks in the series
+
+    Returns:
+        2-d int16 ndarray (bands x dates)
+    """
+    years = (dates - dates[0]) / AVG_DAYS_YR
+    phase = rng.uniform(0, 2 * np.pi)
+
+    seasonal = np.sin(2 * np.pi * years + phase)
+    signal = LEVELS[:, None] + AMPLITUDES[:, None] * seasonal
+
+    # Each break shifts the level of every reflectance band, either way
+    edges = np.linspace(dates[0], dates[-1], breaks + 2)[1:-1]
+    for edge in edges:
+        shift = rng.choice([-1, 1]) * rng.uniform(0.3, 0.6) * LEVELS
+        shift[-1] = 0
+        signal[:, dates >= edge] += shift[:, None]
+
+    signal += NOISE[:, None] * rng.standard_normal(signal.shape)
+
+    return np.clip(signal, 0, 10000).astype(np.int16)
+
+
+def quality(count, rng, cloud=0.2, snow=0.02, fill=0.01):
+    """
+    Bit-packed QA, mostly clear with the given fractions of cloud, snow and
+    fill.
+
+    Args:
+        count: number of acquisitions
+        rng: numpy RandomState
+        cloud: fraction of cloud or cloud shadow
+        snow: fraction of snow
+        fill: fraction of fill
+
+    Returns:
+        1-d uint16 ndarray
+    """
+    draw = rng.uniform(size=count)
+
+    qas = np.full(count, QA_CLEAR, dtype=np.uint16)
+    qas[draw < cloud + snow + fill] = QA_SNOW
+    qas[draw < cloud + fill] = QA_SHADOW
+    qas[draw < 0.7 * cloud + fill] = QA_CLOUD
+    qas[draw < fill] = QA_FILL
+
+    return qas
+
+
+def series(count, seed=0, breaks=None):
+    """
+    A single pixel of synthetic observations, in the same form as the
+    bundled test/resources/*.npy pixels.
+
+    Cloudy observations are brightened and fill is set to -9999, as they would
+    be in ARD, so they are screened out by the QA and the spectral filters.
+
+    Args:
+        count: number of acquisitions
+        seed: seed for the numpy RandomState
+        breaks: number of breaks, defaults to one for every 500 acquisitions
+
+    Returns:
+        dict of keyword arguments for ccd.detect
+    """
+    rng = np.random.RandomState(seed)
+
+    if breaks is None:
+        breaks = count // 500
+
+    dates = acquisition_dates(count, rng)
+    observations = spectra(dates, rng, breaks)
+    qas = quality(count, rng)
+
+    observations[:6, qas == QA_CLOUD] = np.minimum(
+        observations[:6, qas == QA_CLOUD] + 3000, 10000)
+    observations[:, qas == QA_FILL] = -9999
+
+    pixel = dict(zip(BANDS, observations))
+    pixel['dates'] = dates
+    pixel['qas'] = qas
+
+    return pixel
+
+
+def landsat7(dates, rng):
+    """
+    Which of the acquisitions were from Landsat 7, splitting the dates that
+    two sensors were imaging between them.
+
+    Args:
+        dates: 1-d ndarray of ordinal dates
+        rng: numpy RandomState
+
+    Returns:
+        1-d bool ndarray
+    """
+    alone = (dates >= LT05_STOP) & (dates < LC08_START)
+    shared = rng.uniform(size=dates.shape[0]) < 0.5
+
+    return (dates >= LE07_START) & (alone | shared)
+
+
+def slc_gaps(row, cols, affected, offsets):
+    """
+    The pixels in a row that fall in the SLC-off gaps for each acquisition.
+    The gaps run diagonally across the chip, shifting from one acquisition to
+    the next.
+
+    Args:
+        row: index of the row in the chip
+        cols: number of pixels in the row
+        affected: 1-d bool ndarray, the Landsat 7 acquisitions after the
+            SLC failure
+        offsets: 1-d int ndarray, where the gaps start for each acquisition,
+            the same for every row of the chip
+
+    Returns:
+        2-d bool ndarray (dates x cols)
+    """
+    position = np.arange(cols)[None, :] + offsets[:, None] + row // 4
+
+    return affected[:, None] & (position % SLC_PERIOD < SLC_WIDTH)
+
+
+def chip_spectra(dates, pixels, rng, breaks):
+    """
+    Seasonal signal for each band and pixel, every pixel having its own
+    levels, phase and breaks.
+
+    Args:
+        dates: 1-d ndarray of ordinal dates
+        pixels: number of pixels
+        rng: numpy RandomState
+        breaks: (fewest, most) breaks for each pixel
+
+    Returns:
+        3-d float32 ndarray (bands x dates x pixels)
+        2-d int64 ndarray (pixels x most breaks), ordinal date of each break
+            or 0
+    """
+    years = ((dates - dates[0]) / AVG_DAYS_YR).astype(np.float32)
+    bands = LEVELS.shape[0]
+
+    levels = LEVELS[:, None] * rng.uniform(0.7, 1.3, size=(bands, pixels))
+    amplitudes = AMPLITUDES[:, None] * rng.uniform(0.5, 1.5,
+                                                   size=(bands, pixels))
+    phase = rng.uniform(0, 2 * np.pi, size=pixels)
+
+    seasonal = np.sin(2 * np.pi * years[:, None] + phase[None, :])
+    signal = levels[:, None, :] + amplitudes[:, None, :] * seasonal[None, :, :]
+    signal = signal.astype(np.float32)
+
+    counts = rng.randint(breaks[0], breaks[1] + 1, size=pixels)
+    days = np.sort(rng.uniform(dates[0] + 365, dates[-1] - 365,
+                               size=(pixels, breaks[1])), axis=1)
+    days = np.where(np.arange(breaks[1])[None, :] < counts[:, None],
+                    days.astype(np.int64), 0)
+
+    for edge in days.T:
+        sign = rng.choice([-1, 1], size=pixels)
+        shift = sign * rng.uniform(0.3, 0.6, size=pixels)
+        shift = shift[None, :] * LEVELS[:, None]
+        shift[-1] = 0
+
+        after = (dates[:, None] >= edge[None, :]) & (edge[None, :] > 0)
+        signal += (shift[:, None, :] * after[None, :, :]).astype(np.float32)
+
+    noise = rng.standard_normal(signal.shape).astype(np.float32)
+    signal += NOISE[:, None, None] * noise
+
+    return signal, days
+
+
+def cloud_cover(count, rng, cloud):
+    """
+    Fraction of the chip under cloud or cloud shadow for each acquisition,
+    drawn around the mean.
+
+    Args:
+        count: number of acquisitions
+        rng: numpy RandomState
+        cloud: mean fraction
+
+    Returns:
+        1-d ndarray
+    """
+    if cloud <= 0 or cloud >= 1:
+        return np.full(count, float(np.clip(cloud, 0, 1)))
+
+    return rng.beta(2 * cloud, 2 * (1 - cloud), size=count)
+
+
+def northern_winter(dates):
+    """
+    Which of the dates fall in December, January or February.
+
+    Args:
+        dates: 1-d ndarray of ordinal dates
+
+    Returns:
+        1-d bool ndarray
+    """
+    # 1970-01-01 as an ordinal date
+    days = np.asarray(dates - 719163, dtype='datetime64[D]')
+    months = days.astype('datetime64[M]').astype(int) % 12
+
+    return np.isin(months, (0, 1, 11))
+
+
+def chip_quality(cover, winter, pixels, rng, snow):
+    """
+    Bit-packed QA for every acquisition and pixel.
+
+    Args:
+        cover: 1-d ndarray, cloud cover for each acquisition
+        winter: 1-d bool ndarray, the acquisitions that can have snow
+        pixels: number of pixels
+        rng: numpy RandomState
+        snow: fraction of snow during the winter
+
+    Returns:
+        2-d uint16 ndarray (dates x pixels)
+    """
+    count = cover.shape[0]
+    draw = rng.uniform(size=(count, pixels))
+
+    qas = np.full((count, pixels), QA_CLEAR, dtype=np.uint16)
+    qas[winter[:, None] & (draw > 1 - snow)] = QA_SNOW
+    qas[draw < cover[:, None]] = QA_SHADOW
+    qas[draw < 0.7 * cover[:, None]] = QA_CLOUD
+
+    return qas
+
+
+def chip(path, rows, cols, count=1500, seed=0, breaks=(0, 3), cloud=0.3,
+         snow=0.1, slc_off=True):
+    """
+    Write a synthetic chip as .npy files that can be memory mapped.
+
+    The chip is generated a row at a time, each row from its own seeded
+    RandomState, so the whole chip never has to fit in memory and the same
+    seed always gives the same chip.
+
+    Files written to the path directory:
+        dates.npy: (dates,) int64 ordinal dates, shared by every pixel
+        spectra.npy: (7, dates, rows * cols) int16, blue, green, red, nir,
+            swir1, swir2 and thermal, the pixels in row major order, as
+            taken by ccd.detect_block
+        qas.npy: (dates, rows * cols) uint16 bit-packed ARD QA
+        breaks.npy: (rows * cols, most breaks) int64 ordinal date of each
+            break in the signal, 0 past the last
+        chip.json: the arguments it was generated with
+
+    Args:
+        path: directory to write to, created if needed
+        rows: number of rows of pixels
+        cols: number of columns of pixels
+        count: number of acquisitions
+        seed: seed for the numpy RandomStates
+        breaks: (fewest, most) breaks for each pixel, or a single number
+        cloud: mean fraction of cloud or cloud shadow for each acquisition
+        snow: fraction of snow during the winter months
+        slc_off: whether to leave the Landsat 7 SLC-off gaps unfilled
+
+    Returns:
+        str: the path
+    """
+    if np.isscalar(breaks):
+        breaks = (breaks, breaks)
+
+    os.makedirs(path, exist_ok=True)
+
+    # Everything shared across the chip comes from the one RandomState
+    rng = np.random.RandomState(seed)
+    dates = acquisition_dates(count, rng)
+    slc_affected = landsat7(dates, rng) & (dates >= SLC_OFF)
+    slc_offsets = rng.randint(0, SLC_PERIOD, size=count)
+    cover = cloud_cover(count, rng, cloud)
+    winter = northern_winter(dates)
+
+    pixels = rows * cols
+    bands = LEVELS.shape[0]
+
+    np.save(os.path.join(path, 'dates.npy'), dates)
+
+    def open_memmap(name, dtype, shape):
+        return np.lib.format.open_memmap(os.path.join(path, name), mode='w+',
+                                         dtype=dtype, shape=shape)
+
+    spectra_out = open_memmap('spectra.npy', np.int16, (bands, count, pixels))
+    qas_out = open_memmap('qas.npy', np.uint16, (count, pixels))
+    breaks_out = open_memmap('breaks.npy', np.int64, (pixels, breaks[1]))
+
+    for row in range(rows):
+        row_rng = np.random.RandomState([seed, row])
+        cols_slice = slice(row * cols, (row + 1) * cols)
+
+        signal, days = chip_spectra(dates, cols, row_rng, breaks)
+        qas = chip_quality(cover, winter, cols, row_rng, snow)
+
+        # Cloud is bright, and fill is -9999 as it is in ARD
+        cloudy = qas == QA_CLOUD
+        signal[:6] += 3000 * cloudy[None, :, :]
+        observations = np.clip(signal, 0, 10000).astype(np.int16)
+
+        fill = row_rng.uniform(size=qas.shape) < 0.005
+        if slc_off:
+            fill |= slc_gaps(row, cols, slc_affected, slc_offsets)
+
+        qas[fill] = QA_FILL
+        observations[:, fill] = -9999
+
+        spectra_out[:, :, cols_slice] = observations
+        qas_out[:, cols_slice] = qas
+        breaks_out[cols_slice] = days
+
+    for out in (spectra_out, qas_out, breaks_out):
+        out.flush()
+    del spectra_out, qas_out, breaks_out
+
+    with open(os.path.join(path, 'chip.json'), 'w') as f:
+        json.dump({'rows': rows, 'cols': cols, 'count': count, 'seed': seed,
+                   'breaks': list(breaks), 'cloud': cloud, 'snow': snow,
+                   'slc_off': slc_off}, f, indent=2)
+
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.synthetic',
+                                     description='Write a synthetic chip')
+    parser.add_argument('path', help='directory to write the chip to')
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--cols', type=int, default=100)
+    parser.add_argument('--count', type=int, default=1500,
+                        help='number of acquisitions')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--breaks', type=int, nargs=2, default=(0, 3),
+                        metavar=('FEWEST', 'MOST'),
+                        help='range of the number of breaks per pixel')
+    parser.add_argument('--cloud', type=float, default=0.3,
+                        help='mean cloud fraction for each acquisition')
+    parser.add_argument('--snow', type=float, default=0.1,
+                        help='snow fraction during the winter')
+    parser.add_argument('--no-slc-off', dest='slc_off', action='store_false',
+                        help='fill in the Landsat 7 SLC-off gaps')
+    args = parser.parse_args(argv)
+
+    chip(args.path, args.rows, args.cols, count=args.count, seed=args.seed,
+         breaks=tuple(args.breaks), cloud=args.cloud, snow=args.snow,
+         slc_off=args.slc_off)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,8 @@ import logging
 
 from ccd.procedures import fit_procedure as __determine_fit_procedure
 import numpy as np
-from ccd import app, math_utils, qa
+from ccd import app, columnar, math_utils, metrics, qa
+from ccd.models import fitters
 import importlib
 from .version import __version
 from .version import __name
@@ -30,11 +31,14 @@ def attr_from_str(value):
         return None
 
 
-def __attach_metadata(procedure_results, probs):
+def __attach_metadata(procedure_results, probs, proc_params):
     """
     Attach some information on the algorithm version, what procedure was used,
     and which inputs were used
 
+    With COLUMNAR_RESULTS set, the change models are a structured array of
+    ccd.models.SEGMENT_DTYPE and the processing mask a boolean array.
+
     Returns:
         A dict representing the change detection results
 
@@ -83,6 +87,14 @@ def __attach_metadata(procedure_results, probs):
     """
     change_models, processing_mask = procedure_results
 
+    if proc_params.COLUMNAR_RESULTS:
+        return {'algorithm': algorithm,
+                'processing_mask': np.asarray(processing_mask, dtype=bool),
+                'change_models': columnar.segments(change_models),
+                'cloud_prob': probs[0],
+                'snow_prob': probs[1],
+                'water_prob': probs[2]}
+
     return {'algorithm': algorithm,
             'processing_mask': [int(_) for _ in processing_mask],
             'change_models': change_models,
@@ -101,6 +113,11 @@ def __sort_dates(dates):
     return np.argsort(dates)
 
 
+def __dates_sorted(dates):
+    """ Cheap check for dates that are already in chronological order """
+    return bool(np.all(dates[1:] >= dates[:-1]))
+
+
 def __check_inputs(dates, quality, spectra):
     """
     Make sure the inputs are of the correct relative size to each-other.
@@ -120,14 +137,61 @@ def __check_inputs(dates, quality, spectra):
     assert dates.shape[0] == spectra.shape[1]
 
 
+def __check_block_inputs(dates, quality, spectra):
+    """
+    Make sure the block inputs are of the correct relative size to each-other.
+
+    Args:
+        dates: 1-d ndarray
+        quality: 2-d ndarray, (time, pixels)
+        spectra: 3-d ndarray, (bands, time, pixels)
+    """
+    # Make sure we only have one dimension
+    assert dates.ndim == 1
+    # Make sure we have data
+    assert dates.shape[0] > 0
+    # Make sure quality is a (time, pixels) array lined up with the dates
+    assert quality.ndim == 2
+    assert dates.shape[0] == quality.shape[0]
+    # Make sure there is spectral data for each date and pixel
+    assert spectra.ndim == 3
+    assert spectra.shape[1:] == quality.shape
+
+
+def __detect_sorted(dates, spectra, qas, fitter_fn, prev_results, proc_params):
+    """
+    Run the detection for a single pixel whose inputs have already been
+    checked, sorted and had their QA unpacked.
+
+    Returns:
+        A dict representing the change detection results
+    """
+    probs = qa.quality_probabilities(qas, proc_params)
+
+    # Determine which procedure to use for the detection
+    procedure = __determine_fit_procedure(dates, qas, prev_results,
+                                          proc_params)
+
+    results = procedure(dates, spectra, fitter_fn, qas, prev_results,
+                        proc_params)
+
+    return __attach_metadata(results, probs, proc_params)
+
+
 def detect(dates, blues, greens, reds, nirs, swir1s, swir2s, thermals,
-           nbrs, ndvis, evis, evi2s, brightnesss, greennesss, wetnesss,
-           qas, prev_results=None, params=None):
+           nbrs=None, ndvis=None, evis=None, evi2s=None, brightnesss=None,
+           greennesss=None, wetnesss=None, qas=None, prev_results=None,
+           params=None):
     """Entry point call to detect change
 
     No filtering up-front as different procedures may do things
     differently
 
+    The index bands can be left out, in which case qas and anything after it
+    are given as keywords:
+
+        detect(dates, blues, ..., thermals, qas=qas, params=params)
+
     Args:
         dates:    1d-array or list of ordinal date values
         blues:    1d-array or list of blue band values
@@ -137,6 +201,10 @@ def detect(dates, blues, greens, reds, nirs, swir1s, swir2s, thermals,
         swir1s:   1d-array or list of swir1 band values
         swir2s:   1d-array or list of swir2 band values
         thermals: 1d-array or list of thermal band values
+        nbrs, ndvis, evis, evi2s, brightnesss, greennesss, wetnesss:
+            optional 1d-arrays or lists of index values. Either all or none
+            of them are given, when left out they are derived from the
+            reflectance bands, only for the observations that get processed
         qas:      1d-array or list of qa band values
         prev_results:  Previous set of results to be updated with
             new observations
@@ -146,6 +214,48 @@ def detect(dates, blues, greens, reds, nirs, swir1s, swir2s, thermals,
     Returns:
         Tuple of ccd.detections namedtuples
     """
+    if qas is None:
+        raise TypeError('detect missing the qas, give it as a keyword when '
+                        'the index bands are left out')
+
+    derived = (nbrs, ndvis, evis, evi2s, brightnesss, greennesss, wetnesss)
+    given = [band is not None for band in derived]
+
+    if all(given):
+        spectra = np.stack((blues, greens, reds, nirs, swir1s, swir2s,
+                            thermals) + derived)
+    elif not any(given):
+        spectra = np.stack((blues, greens, reds, nirs, swir1s, swir2s,
+                            thermals))
+    else:
+        raise ValueError('Either all or none of the index bands must be given')
+
+    return detect_array(dates, spectra, qas, prev_results=prev_results,
+                        params=params)
+
+
+def detect_array(dates, spectra, qas, prev_results=None, params=None):
+    """Entry point call to detect change for spectra that are already stacked
+    into a single array.
+
+    The spectra are used as given, they can be a strided view into a larger
+    chip cube such as cube[:, :, pixel]. When the dates are already in
+    chronological order, nothing is copied or sorted up front.
+
+    Args:
+        dates: 1d-array or list of ordinal date values
+        spectra: 2d-array shaped (bands, time), the bands being in the same
+            order as the ccd.detect arguments, with or without the index bands
+        qas: 1d-array or list of qa band values
+        prev_results:  Previous set of results to be updated with
+            new observations
+        params: python dictionary to change module wide processing
+            parameters
+
+    Returns:
+        A dict representing the change detection results, in the same form
+        as returned by ccd.detect
+    """
     t1 = time.time()
 
     proc_params = app.get_default_params()
@@ -155,30 +265,123 @@ def detect(dates, blues, greens, reds, nirs, swir1s, swir2s, thermals,
 
     dates = np.asarray(dates)
     qas = np.asarray(qas)
-
-    spectra = np.stack((blues, greens, reds, nirs, swir1s, swir2s, thermals,
-                        nbrs, ndvis, evis, evi2s, brightnesss, greennesss, wetnesss))
+    spectra = np.asarray(spectra)
 
     __check_inputs(dates, qas, spectra)
 
-    indices = __sort_dates(dates)
-    dates = dates[indices]
-    spectra = spectra[:, indices]
-    qas = qas[indices]
+    if not __dates_sorted(dates):
+        indices = __sort_dates(dates)
+        dates = dates[indices]
+        spectra = spectra[:, indices]
+        qas = qas[indices]
 
     # load the fitter_fn
-    fitter_fn = attr_from_str(proc_params.FITTER_FN)
+    fitter_fn = fitters.resolve(proc_params.FITTER_FN)
+
+    report = proc_params.METRICS is True
+    collector = metrics.collector(proc_params.METRICS)
+    proc_params.METRICS = collector
 
     if proc_params.QA_BITPACKED is True:
-        qas = qa.unpackqa(qas, proc_params)
+        with collector.timer('qa'):
+            qas = qa.unpackqa_lut(qas, proc_params)
 
-    probs = qa.quality_probabilities(qas, proc_params)
+    with collector.timer('detect'):
+        results = __detect_sorted(dates, spectra, qas, fitter_fn, prev_results,
+                                  proc_params)
 
-    # Determine which procedure to use for the detection
-    procedure = __determine_fit_procedure(dates, qas, prev_results, proc_params)
-
-    results = procedure(dates, spectra, fitter_fn, qas, prev_results, proc_params)
     log.debug('Total time for algorithm: %s', time.time() - t1)
 
+    if report:
+        results['metrics'] = collector.as_dict()
+
     # call detect and return results as the detections namedtuple
-    return __attach_metadata(results, probs)
+    return results
+
+
+def detect_block(dates, spectra_cube, qas_cube, params=None,
+                 prev_results=None):
+    """Entry point call to detect change across a block of pixels that share
+    the same acquisition dates.
+
+    Work that only depends on the shared dates or the parameters, such as
+    sorting, QA unpacking and resolving the fitter, is done once for the
+    whole block rather than once per pixel.
+
+    Args:
+        dates: 1d-array or list of ordinal date values shared by every pixel
+        spectra_cube: 3d-array shaped (bands, time, pixels), the bands being
+            in the same order as the ccd.detect arguments. With only the
+            7 reflectance and thermal bands the indices are derived
+        qas_cube: 2d-array shaped (time, pixels) of qa band values
+        params: python dictionary to change module wide processing
+            parameters
+        prev_results: optional sequence, one previous set of results per
+            pixel, to be updated with new observations
+
+    Returns:
+        list of change detection results, one per pixel, in the same form
+        as returned by ccd.detect
+    """
+    t1 = time.time()
+
+    proc_params = app.get_default_params()
+
+    if params:
+        proc_params.update(params)
+
+    dates = np.asarray(dates)
+    qas_cube = np.asarray(qas_cube)
+    spectra_cube = np.asarray(spectra_cube)
+
+    __check_block_inputs(dates, qas_cube, spectra_cube)
+
+    if not __dates_sorted(dates):
+        indices = __sort_dates(dates)
+        dates = dates[indices]
+        spectra_cube = spectra_cube[:, indices]
+        qas_cube = qas_cube[indices]
+
+    fitter_fn = fitters.resolve(proc_params.FITTER_FN)
+
+    # With METRICS set to True each pixel gets its own, otherwise everything
+    # goes into the one collector
+    report = proc_params.METRICS is True
+    collector = metrics.collector(None if report else proc_params.METRICS)
+    proc_params.METRICS = collector
+
+    if proc_params.QA_BITPACKED is True:
+        with collector.timer('qa'):
+            qas_cube = qa.unpackqa_lut(qas_cube, proc_params)
+
+    pixel_count = qas_cube.shape[1]
+
+    if prev_results is None:
+        prev_results = [None] * pixel_count
+
+    results = []
+    for px in range(pixel_count):
+        # The procedures adjust the parameters in place, so each pixel gets
+        # its own copy. The spectra are left alone and passed as a view.
+        pixel_params = app.Parameters(proc_params)
+
+        if report:
+            pixel_params.METRICS = metrics.Metrics()
+
+        with pixel_params.METRICS.timer('detect'):
+            result = __detect_sorted(dates,
+                                     spectra_cube[:, :, px],
+                                     qas_cube[:, px],
+                                     fitter_fn,
+                                     prev_results[px],
+                                     pixel_params)
+
+        if report:
+            result['metrics'] = pixel_params.METRICS.as_dict()
+
+        results.append(result)
+
+    log.debug('Total time for algorithm on %s pixels: %s', pixel_count,
+              time.time() - t1)
+
+    return results
@@ -38,16 +38,17 @@ class Parameters(dict):
             raise AttributeError('No such attribute: ' + name)
 
 
-# Don't need to be going down this rabbit hole just yet
-# mainly here as reference
+# Used to key caches on the contents of an array, such as the design matrices
+# in ccd.models.lasso
 def numpy_hashkey(array):
     return hashlib.sha1(array).hexdigest()
 
 
-# This is a string.fully.qualified.reference to the fitter function.
+# This is a registered fitter name, or a string.fully.qualified.reference to
+# the fitter function, resolved through ccd.models.fitters.
 # Cannot import and supply the function directly or we'll get a
 # circular dependency
-FITTER_FN = 'ccd.models.lasso.fitted_model'
+FITTER_FN = 'lasso'
 
 
 def get_default_params():
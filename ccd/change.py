@@ -10,16 +10,46 @@ import numpy as np
 from scipy.stats import chi2
 
 from ccd.models import lasso
+from ccd.models import stack_models
 from ccd.math_utils import sum_of_squares
 
 log = logging.getLogger(__name__)
 
 
+def stability_norm(slopes, first_residuals, last_residuals, rmse, variogram):
+    """
+    Vectorized stability measure, the sum of squares across the bands of the
+    slope and end point residuals, normalized by the larger of the rmse or
+    variogram value.
+
+    All of the arguments are arrays with the bands along the last axis, so
+    any number of leading axes (e.g. candidate windows) are evaluated at once.
+
+    Args:
+        slopes: slope coefficients scaled by the number of days covered
+        first_residuals: residual of the first observation in the window
+        last_residuals: residual of the last observation in the window
+        rmse: model rmse values
+        variogram: variogram values to compare against for the
+            normalization factor
+
+    Returns:
+        ndarray of the stability norms, or a float for a single window
+    """
+    rmse_norm = np.maximum(variogram, rmse)
+
+    check_vals = (np.abs(slopes) + np.abs(first_residuals) +
+                  np.abs(last_residuals)) / rmse_norm
+
+    return sum_of_squares(check_vals, axis=-1)
+
+
 def stable(models, dates, variogram, t_cg, detection_bands):
     """Determine if we have a stable model to start building with
 
     Args:
-        models: list of current representative/fitted models
+        models: list of current representative/fitted models, or the same
+            already stacked into arrays
         variogram: 1-d array of variogram values to compare against for the
             normalization factor
         dates: array of ordinal date values
@@ -30,19 +60,15 @@ def stable(models, dates, variogram, t_cg, detection_bands):
     Returns:
         Boolean on whether stable or not
     """
-    # This could be written differently, or more performant using numpy in the
-    # future
-    check_vals = []
-    for idx in detection_bands:
-        rmse_norm = max(variogram[idx], models[idx].rmse)
-        slope = models[idx].fitted_model.coef_[0] * (dates[-1] - dates[0])
-
-        check_val = (abs(slope) + abs(models[idx].residual[0]) +
-                     abs(models[idx].residual[-1])) / rmse_norm
+    stacked = stack_models(models)
 
-        check_vals.append(check_val)
+    euc_norm = stability_norm(
+        stacked.coefficients[detection_bands, 0] * (dates[-1] - dates[0]),
+        stacked.residuals[detection_bands, 0],
+        stacked.residuals[detection_bands, -1],
+        stacked.rmse[detection_bands],
+        variogram[detection_bands])
 
-    euc_norm = sum_of_squares(np.array(check_vals))
     log.debug('Stability norm: %s, Check against: %s', euc_norm, t_cg)
 
     return euc_norm < t_cg
@@ -74,21 +100,50 @@ def change_magnitude(residuals, variogram, comparison_rmse):
     return change_mag
 
 
-def calc_residuals(dates, observations, model, avg_days_yr):
+def search_bands(band_count, detection_bands, detection_only):
+    """
+    Determine which bands need to be fit while searching for breaks.
+
+    Args:
+        band_count: total number of spectral bands
+        detection_bands: index locations of the spectral bands that are used
+            to detect change
+        detection_only: only fit the detection bands during the search
+
+    Returns:
+        1-d ndarray: index locations of the bands to fit
+        1-d ndarray: where the detection bands fall within the fitted bands
+    """
+    detection_bands = np.asarray(detection_bands)
+
+    if detection_only:
+        return detection_bands, np.arange(detection_bands.shape[0])
+
+    return np.arange(band_count), detection_bands
+
+
+def calc_residuals(dates, observations, model, avg_days_yr, design=None):
     """
     Calculate the residuals using the fitted model.
 
+    Given BandModels and a 2-d block of observations, every band is predicted
+    from a single design matrix for the dates.
+
     Args:
         dates: ordinal dates associated with the observations
-        observations: spectral observations
-        model: named tuple with the scipy model, rmse, and residuals
+        observations: spectral observations, 1-d for a single band or 2-d
+            with each band as a row
+        model: FittedModel for a single band, or BandModels for all of them
+        avg_days_yr: average number of days in a year
+        design: optional design matrix rows for the dates, see lasso.predict
 
     Returns:
-        1-d ndarray of residuals
+        ndarray of residuals, shaped the same as the observations
     """
     # This needs to be modularized in the future.
     # Basically the model object should have a predict method with it.
-    return np.abs(observations - lasso.predict(model, dates, avg_days_yr))
+    return np.abs(observations - lasso.predict(model, dates, avg_days_yr,
+                                               design))
 
 
 def detect_change(magnitudes, change_threshold):
@@ -267,6 +322,147 @@ def update_processing_mask(mask, index, window=None):
     return new_mask
 
 
+class MaskedObservations(object):
+    """
+    The dates and spectra that pass the processing mask, compacted into
+    buffers that are kept up to date as observations get masked out.
+
+    Masking out observations only records them, along with the processing
+    mask. The buffers are compacted lazily, the next time the period, spectra
+    or design are read, shifting what comes after the first observation
+    masked out down once, however many were masked out since. Index values
+    are in relation to the compacted observations, the same as for
+    update_processing_mask.
+
+    The period and spectra are views into the buffers. They stay as they were
+    after a removal, up until they are next read and the buffers compacted,
+    so anything that needs to hold on to them past that should take a copy.
+
+    Args:
+        dates: 1-d ndarray of ordinal day values
+        observations: 2-d ndarray of spectral values
+        processing_mask: 1-d boolean ndarray of the observations to use
+        design: optional 2-d ndarray of the design matrix rows for every one
+            of the dates, such as from lasso.design_cache for the acquisition
+            calendar, compacted along with the dates
+    """
+    def __init__(self, dates, observations, processing_mask, design=None):
+        self.mask = np.array(processing_mask, dtype=bool)
+        self.count = int(np.sum(self.mask))
+
+        self.__positions = np.flatnonzero(self.mask)
+        self.__dates = dates[self.mask]
+        self.__spectra = observations[:, self.mask]
+        self.__design = None if design is None else design[self.mask]
+
+        # Observations in the buffers, including those masked out but not yet
+        # compacted away, and which of them are masked out
+        self.__size = self.count
+        self.__removed = None
+
+    @property
+    def pending(self):
+        """Number of observations masked out but not yet compacted away"""
+        return self.__size - self.count
+
+    @property
+    def period(self):
+        """1-d ndarray of the dates still being processed"""
+        self.__compact()
+        return self.__dates[:self.count]
+
+    @property
+    def spectra(self):
+        """2-d ndarray of the spectral values still being processed"""
+        self.__compact()
+        return self.__spectra[:, :self.count]
+
+    @property
+    def design(self):
+        """2-d ndarray of the design matrix rows still being processed, or
+        None if no design was given"""
+        if self.__design is None:
+            return None
+
+        self.__compact()
+        return self.__design[:self.count]
+
+    def design_rows(self, window):
+        """
+        Design matrix rows for a window of the observations still being
+        processed.
+
+        Args:
+            window: slice object
+
+        Returns:
+            2-d ndarray view, or None if no design was given
+        """
+        if self.__design is None:
+            return None
+
+        return self.design[window]
+
+    def remove(self, index, window=None):
+        """
+        Mask out observations.
+
+        Args:
+            index: int/list/tuple of index(es) to be excluded from processing,
+                or boolean array
+            window: slice object identifying a further subset of the
+                observations that the index is in relation to
+        """
+        start, stop, step = (window or slice(None)).indices(self.count)
+        length = len(range(start, stop, step))
+
+        index = np.asarray(index)
+        if index.dtype == bool:
+            index = np.flatnonzero(index)
+
+        removed = np.unique(start + step * (np.atleast_1d(index) % length))
+
+        if removed.size == 0:
+            return
+
+        # Index values are in relation to the observations as they are after
+        # any earlier removals, so step over those still in the buffers
+        if self.__removed is not None:
+            gaps = self.__removed - np.arange(self.__removed.size)
+            removed += np.searchsorted(gaps, removed, side='right')
+
+        self.mask[self.__positions[removed]] = False
+        self.count -= removed.size
+
+        if self.__removed is not None:
+            removed = np.union1d(self.__removed, removed)
+        self.__removed = removed
+
+    def __compact(self):
+        """
+        Shift the observations after the first one masked out down over the
+        ones that have been.
+        """
+        if self.__removed is None:
+            return
+
+        # Only the observations from the first one removed onwards move
+        start = self.__removed[0]
+        keep = np.ones(self.__size - start, dtype=bool)
+        keep[self.__removed - start] = False
+
+        for buffer in (self.__positions, self.__dates):
+            buffer[start:self.count] = buffer[start:self.__size][keep]
+        self.__spectra[:, start:self.count] = \
+            self.__spectra[:, start:self.__size][:, keep]
+        if self.__design is not None:
+            self.__design[start:self.count] = \
+                self.__design[start:self.__size][keep]
+
+        self.__size = self.count
+        self.__removed = None
+
+
 def find_closest_doy(dates, date_idx, window, num):
     """
     Find the closest n dates based on day of year.
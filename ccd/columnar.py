@@ -0,0 +1,259 @@
+"""
+Change detection results kept in columns rather than nested dicts.
+
+With the COLUMNAR_RESULTS parameter set, the change_models of each set of
+results are a structured array of ccd.models.SEGMENT_DTYPE, one record for
+each segment, and the processing_mask is a boolean array instead of a list of
+ints. A record's fields are read the same way as the keys of the dicts, such
+as segment['break_day'], the rmse, magnitude, intercept and coefficients
+being arrays over the bands in ccd.models.BAND_NAMES order.
+
+ResultTable appends the results of many pixels, in either form, into column
+arrays that can be saved or handed on without any per segment objects:
+
+    from ccd import parallel
+
+    table = ResultTable()
+    table.extend(parallel.detect_tile(dates, spectra, qas, params))
+    np.save('segments.npy', table.segments)
+"""
+import numpy as np
+
+from ccd.models import BAND_NAMES
+from ccd.models import SEGMENT_DTYPE
+
+# Segments of many pixels, each tagged with the index of its pixel
+TABLE_DTYPE = np.dtype([('pixel', np.int64)] + SEGMENT_DTYPE.descr)
+
+# What is kept for each pixel, besides its processing mask
+PIXEL_DTYPE = np.dtype([('pixel', np.int64),
+                        ('segment_count', np.int32),
+                        ('cloud_prob', np.float64),
+                        ('snow_prob', np.float64),
+                        ('water_prob', np.float64)])
+
+
+def segment(model):
+    """
+    Convert a change model dict, as made by results_to_changemodel, into a
+    record.
+
+    Args:
+        model: dict for a single segment
+
+    Returns:
+        numpy.void record of SEGMENT_DTYPE
+    """
+    record = np.zeros((), dtype=SEGMENT_DTYPE)
+
+    for name in ('start_day', 'end_day', 'break_day', 'observation_count',
+                 'change_probability', 'curve_qa'):
+        record[name] = model[name]
+
+    for ix, band in enumerate(BAND_NAMES):
+        if band not in model:
+            continue
+
+        coefficients = model[band]['coefficients']
+        record['rmse'][ix] = model[band]['rmse']
+        record['magnitude'][ix] = model[band]['magnitude']
+        record['intercept'][ix] = model[band]['intercept']
+        record['coefficients'][ix, :len(coefficients)] = coefficients
+
+    return record[()]
+
+
+def segments(change_models):
+    """
+    Put the change models for a pixel into a structured array.
+
+    Args:
+        change_models: sequence of dicts or SEGMENT_DTYPE records, or a
+            structured array which is returned as is
+
+    Returns:
+        1-d ndarray of SEGMENT_DTYPE
+    """
+    if isinstance(change_models, np.ndarray):
+        return change_models
+
+    return np.array([model if isinstance(model, np.void) else segment(model)
+                     for model in change_models], dtype=SEGMENT_DTYPE)
+
+
+def changemodels(records):
+    """
+    Convert segment records back into the change model dicts made by
+    results_to_changemodel.
+
+    Args:
+        records: structured array of SEGMENT_DTYPE or TABLE_DTYPE
+
+    Returns:
+        list of dicts
+    """
+    models = []
+    for record in records:
+        model = {'start_day': int(record['start_day']),
+                 'end_day': int(record['end_day']),
+                 'break_day': int(record['break_day']),
+                 'observation_count': int(record['observation_count']),
+                 'change_probability': float(record['change_probability']),
+                 'curve_qa': int(record['curve_qa'])}
+
+        for ix, band in enumerate(BAND_NAMES):
+            model[band] = {'rmse': float(record['rmse'][ix]),
+                           'coefficients': tuple(float(c) for c in
+                                                 record['coefficients'][ix]),
+                           'intercept': float(record['intercept'][ix]),
+                           'magnitude': float(record['magnitude'][ix])}
+
+        models.append(model)
+
+    return models
+
+
+class ResultTable(object):
+    """
+    Column arrays of the change detection results for many pixels, appended
+    to a pixel at a time.
+
+    The processing masks are kept packed 8 to a byte, so every pixel must
+    have the same number of observations, as they do across a chip.
+
+    Attributes:
+        algorithm: the algorithm string from the results
+    """
+    def __init__(self, capacity=1024):
+        self.algorithm = None
+        self.__segments = np.zeros(capacity, dtype=TABLE_DTYPE)
+        self.__pixels = np.zeros(capacity, dtype=PIXEL_DTYPE)
+        self.__masks = None
+        self.__observations = None
+        self.__segment_count = 0
+        self.__pixel_count = 0
+
+    def __len__(self):
+        return self.__pixel_count
+
+    @staticmethod
+    def __grow(array, size):
+        """
+        Resize a buffer to hold at least size rows, at least doubling it so
+        that appending stays linear overall.
+        """
+        if size <= array.shape[0]:
+            return array
+
+        grown = np.zeros((max(size, 2 * array.shape[0]),) + array.shape[1:],
+                         dtype=array.dtype)
+        grown[:array.shape[0]] = array
+
+        return grown
+
+    @property
+    def segments(self):
+        """
+        Returns:
+            1-d ndarray of TABLE_DTYPE, the segments of every pixel in the
+            order they were appended
+        """
+        return self.__segments[:self.__segment_count]
+
+    @property
+    def pixels(self):
+        """
+        Returns:
+            1-d ndarray of PIXEL_DTYPE, one row for each pixel
+        """
+        return self.__pixels[:self.__pixel_count]
+
+    @property
+    def processing_masks(self):
+        """
+        Returns:
+            2-d boolean ndarray (pixels, observations)
+        """
+        if self.__masks is None:
+            return np.zeros((0, 0), dtype=bool)
+
+        return np.unpackbits(self.__masks[:self.__pixel_count], axis=1,
+                             count=self.__observations).astype(bool)
+
+    def append(self, pixel, results):
+        """
+        Add the results for a pixel.
+
+        Args:
+            pixel: index of the pixel, such as row * cols + col in a chip
+            results: change detection results, with the change models as
+                dicts or in columns
+        """
+        records = segments(results['change_models'])
+        mask = np.asarray(results['processing_mask'], dtype=bool)
+
+        if self.__masks is None:
+            self.__observations = mask.shape[0]
+            self.__masks = np.zeros((self.__pixels.shape[0],
+                                     (mask.shape[0] + 7) // 8), dtype=np.uint8)
+        elif mask.shape[0] != self.__observations:
+            raise ValueError('Processing mask has {} observations, the table '
+                             'has {}'.format(mask.shape[0],
+                                             self.__observations))
+
+        self.algorithm = results['algorithm']
+
+        start = self.__segment_count
+        stop = start + records.shape[0]
+        self.__segments = self.__grow(self.__segments, stop)
+        self.__segments['pixel'][start:stop] = pixel
+        for name in SEGMENT_DTYPE.names:
+            self.__segments[name][start:stop] = records[name]
+        self.__segment_count = stop
+
+        row = self.__pixel_count
+        self.__pixels = self.__grow(self.__pixels, row + 1)
+        self.__masks = self.__grow(self.__masks, row + 1)
+        self.__pixels[row] = (pixel, records.shape[0], results['cloud_prob'],
+                              results['snow_prob'], results['water_prob'])
+        self.__masks[row] = np.packbits(mask)
+        self.__pixel_count = row + 1
+
+    def extend(self, pixel_results):
+        """
+        Add the results for many pixels.
+
+        Args:
+            pixel_results: iterable of (pixel index, results), as yielded by
+                ccd.parallel.detect_tile and ccd.reader.Cube.detect
+        """
+        for pixel, results in pixel_results:
+            self.append(pixel, results)
+
+    def results(self, row):
+        """
+        Results for the pixel appended at the given row, in columns, as
+        detect returns them with COLUMNAR_RESULTS set.
+
+        Args:
+            row: position of the pixel in the table
+
+        Returns:
+            dict
+        """
+        pixel = self.pixels[row]
+        start = int(np.sum(self.pixels['segment_count'][:row]))
+        rows = self.segments[start:start + pixel['segment_count']]
+
+        records = np.zeros(rows.shape[0], dtype=SEGMENT_DTYPE)
+        for name in SEGMENT_DTYPE.names:
+            records[name] = rows[name]
+
+        mask = np.unpackbits(self.__masks[row], count=self.__observations)
+
+        return {'algorithm': self.algorithm,
+                'processing_mask': mask.astype(bool),
+                'change_models': records,
+                'cloud_prob': float(pixel['cloud_prob']),
+                'snow_prob': float(pixel['snow_prob']),
+                'water_prob': float(pixel['water_prob'])}
@@ -0,0 +1,174 @@
+"""
+Spectral indices derived from the reflectance bands.
+
+Reflectance is expected in the same scaled form as the rest of the spectra,
+0..10,000. The ratio indices are returned on that same scale, and the
+tasseled cap components, being linear combinations of the reflectance, come
+out scaled as well.
+
+The derived bands are appended after the thermal band, in the order
+nbr, ndvi, evi, evi2, brightness, greenness, wetness.
+"""
+import numpy as np
+
+# Scale factor applied to the reflectance values
+SCALE = 10000
+
+# Tasseled cap coefficients for reflectance factor data, Crist 1985
+# blue, green, red, nir, swir1, swir2
+TASSELED_CAP = np.array([[0.2043, 0.4158, 0.5524, 0.5741, 0.3124, 0.2303],
+                         [-0.1603, -0.2819, -0.4934, 0.7940, -0.0002, -0.1446],
+                         [0.0315, 0.2021, 0.3102, 0.1594, -0.6806, -0.6109]])
+
+INDEX_COUNT = 7
+
+
+def __ratio(numerator, denominator):
+    """
+    Divide, giving zero wherever the denominator is zero, such as saturated
+    or zeroed out observations.
+    """
+    return np.divide(numerator, denominator,
+                     out=np.zeros(np.shape(numerator)),
+                     where=denominator != 0)
+
+
+def normalized_difference(a, b):
+    """
+    Scaled normalized difference between two bands, (a - b) / (a + b).
+
+    Args:
+        a: 1-d ndarray
+        b: 1-d ndarray
+
+    Returns:
+        1-d ndarray
+    """
+    return __ratio(SCALE * (a - b), a + b)
+
+
+def evi(blue, red, nir):
+    """
+    Scaled enhanced vegetation index.
+
+    Args:
+        blue: 1-d ndarray of scaled reflectance
+        red: 1-d ndarray of scaled reflectance
+        nir: 1-d ndarray of scaled reflectance
+
+    Returns:
+        1-d ndarray
+    """
+    return __ratio(SCALE * 2.5 * (nir - red),
+                   nir + 6 * red - 7.5 * blue + SCALE)
+
+
+def evi2(red, nir):
+    """
+    Scaled two band enhanced vegetation index.
+
+    Args:
+        red: 1-d ndarray of scaled reflectance
+        nir: 1-d ndarray of scaled reflectance
+
+    Returns:
+        1-d ndarray
+    """
+    return __ratio(SCALE * 2.5 * (nir - red), nir + 2.4 * red + SCALE)
+
+
+def derive(observations, proc_params):
+    """
+    Calculate all of the index bands for a set of observations.
+
+    Args:
+        observations: 2-d ndarray, the reflectance and thermal bands as rows
+        proc_params: dictionary of processing parameters
+
+    Returns:
+        2-d ndarray (indices x observations)
+    """
+    blue = observations[proc_params.BLUE_IDX].astype(float)
+    green = observations[proc_params.GREEN_IDX].astype(float)
+    red = observations[proc_params.RED_IDX].astype(float)
+    nir = observations[proc_params.NIR_IDX].astype(float)
+    swir1 = observations[proc_params.SWIR1_IDX].astype(float)
+    swir2 = observations[proc_params.SWIR2_IDX].astype(float)
+
+    derived = np.empty(shape=(INDEX_COUNT, observations.shape[1]))
+    derived[0] = normalized_difference(nir, swir2)
+    derived[1] = normalized_difference(nir, red)
+    derived[2] = evi(blue, red, nir)
+    derived[3] = evi2(red, nir)
+    derived[4:] = TASSELED_CAP.dot(np.vstack((blue, green, red, nir,
+                                              swir1, swir2)))
+
+    return derived
+
+
+def working_copy(observations, proc_params):
+    """
+    Copy the spectra into a float array with room for the index bands, so
+    the procedures never modify what was handed in. That may well be a view
+    into a larger block of data.
+
+    Args:
+        observations: 2-d ndarray, spectral observations with or without the
+            index bands
+        proc_params: dictionary of processing parameters
+
+    Returns:
+        2-d ndarray: the copy, any index bands that were not given are zero
+        bool: whether the index bands still need to be derived
+    """
+    band_count = proc_params.THERMAL_IDX + 1
+
+    if observations.shape[0] > band_count:
+        return np.array(observations, dtype=float), False
+
+    spectra = np.zeros(shape=(band_count + INDEX_COUNT, observations.shape[1]))
+    spectra[:band_count] = observations
+
+    return spectra, True
+
+
+def fill_indices(spectra, processing_mask, proc_params):
+    """
+    Derive the index bands in place, only for the observations in the
+    processing mask. The rest are left alone, they are never looked at.
+
+    Args:
+        spectra: 2-d ndarray from working_copy
+        processing_mask: 1-d boolean ndarray of the observations that will
+            be used for processing
+        proc_params: dictionary of processing parameters
+    """
+    band_count = proc_params.THERMAL_IDX + 1
+
+    spectra[band_count:, processing_mask] = derive(
+        spectra[:band_count, processing_mask], proc_params)
+
+
+def append_indices(observations, processing_mask, proc_params):
+    """
+    Add the index bands onto the reflectance and thermal bands, only
+    calculating them for the observations in the processing mask.
+
+    Observations that already carry the index bands are returned as is.
+
+    Args:
+        observations: 2-d ndarray, spectral observations
+        processing_mask: 1-d boolean ndarray of the observations that will
+            be used for processing
+        proc_params: dictionary of processing parameters
+
+    Returns:
+        2-d ndarray with the index bands as the last rows
+    """
+    if observations.shape[0] > proc_params.THERMAL_IDX + 1:
+        return observations
+
+    spectra, _ = working_copy(observations, proc_params)
+    fill_indices(spectra, processing_mask, proc_params)
+
+    return spectra
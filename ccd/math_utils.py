@@ -10,7 +10,34 @@ stand-alone. I.e. it should not import any other piece of the overall project.
 from functools import wraps
 
 import numpy as np
-from scipy.stats import mode
+
+
+def variogram_lag(dates, min_gap=30):
+    """
+    Find the smallest lag at which the majority of the gaps between
+    observations are greater than the minimum gap.
+
+    The majority is the most common gap, taking the smallest one when there
+    are ties. As the dates are expected to be sorted, the gaps can only grow
+    with the lag, so with unique integer dates this is found within
+    min_gap + 1 lags regardless of the length of the time series.
+
+    Args:
+        dates: 1-d array of values representing ordinal day
+        min_gap: number of days the majority gap needs to exceed
+
+    Returns:
+        int lag, or None if there is no such lag
+    """
+    for lag in range(1, dates.shape[0]):
+        gaps = dates[lag:] - dates[:-lag]
+
+        values, counts = np.unique(gaps, return_counts=True)
+
+        if values[np.argmax(counts)] > min_gap:
+            return lag
+
+    return None
 
 
 def adjusted_variogram(dates, observations):
@@ -30,39 +57,31 @@ def adjusted_variogram(dates, observations):
     Returns:
         1-d ndarray of floats
     """
-    vario = calculate_variogram(observations)
+    lag = variogram_lag(dates)
 
-    for idx in range(dates.shape[0]):
-        var = dates[1 + idx:] - dates[:-idx - 1]
+    if lag is None:
+        return calculate_variogram(observations)
 
-        majority, _ = mode(var)
+    diff = observations[:, lag:] - observations[:, :-lag]
+    ids = (dates[lag:] - dates[:-lag]) > 30
 
-        if len(majority) == 0:
-            continue
+    return np.median(np.abs(diff[:, ids]), axis=1)
 
-        if majority[0] > 30:
-            diff = observations[:, 1 + idx:] - observations[:, :-idx - 1]
-            ids = var > 30
 
-            vario = np.median(np.abs(diff[:, ids]), axis=1)
-            break
-
-    return vario
-
-
-def euclidean_norm(vector):
+def euclidean_norm(vector, axis=None):
     """
     Calculate the euclidean norm across a vector
 
     This is the default norm method used by Matlab
 
     Args:
-        vector: 1-d array of values
+        vector: 1-d array of values, or n-d array when an axis is given
+        axis: optional axis to calculate the norms along
 
     Returns:
-        float
+        float, or ndarray when an axis is given
     """
-    return np.sum(vector ** 2) ** .5
+    return np.sum(vector ** 2, axis=axis) ** .5
 
 
 def sum_of_squares(vector, axis=None):
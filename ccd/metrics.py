@@ -0,0 +1,150 @@
+"""
+Opt-in timing and counters for the stages of change detection.
+
+Turned on through the METRICS parameter:
+    False/None: nothing is recorded (the default)
+    True: a new Metrics is made for each pixel, and its contents are returned
+        under the 'metrics' key of the results
+    a Metrics instance: everything is recorded into it, accumulating across
+        every pixel it is handed to
+
+Stages timed, in seconds:
+    qa: unpacking the bit-packed QA
+    filter: building the processing mask from the QA and spectral values
+    indices: deriving the index bands
+    variogram: the adjusted variogram
+    initialize, lookback, lookforward, catch: the steps of the standard
+        procedure
+    detect: everything for a pixel once its inputs are checked, sorted and
+        the QA unpacked
+
+Counts:
+    fits: regression fits by FITTER_FN, the lasso by default
+    fit_iterations: coordinate descent sweeps summed over the bands of the
+        lookforward fits, for engines that report them, such as the native
+        lasso, to compare runs with and without FIT_WARM_START
+    tmask_fits: Tmask robust fits
+    span_refits: lookforward refits due to the model window growing past
+        1.33 times the span it was fit over
+    outliers: observations masked out as outliers
+
+detect_block unpacks the QA once for the whole block, so with METRICS set to
+True the per pixel metrics do not include it. ccd.parallel.detect_tile runs
+in other processes, any Metrics given is copied to them and never filled in,
+so use True to get the metrics back with each set of results.
+"""
+from collections import defaultdict
+import time
+
+
+class Timer(object):
+    """
+    Context manager adding the wall time of its block to a stage.
+    """
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class NullTimer(object):
+    """
+    Context manager that does nothing, shared by every disabled timer.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Metrics(object):
+    """
+    Collects the time spent in each stage and the counts of events.
+
+    Attributes:
+        times: dict of seconds spent in each stage
+        counts: dict of the number of times each event happened
+    """
+    enabled = True
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def timer(self, stage):
+        """
+        Time a block of code, accumulating into the given stage.
+
+        Args:
+            stage: name of the stage
+
+        Returns:
+            context manager
+        """
+        return Timer(self, stage)
+
+    def add_time(self, stage, seconds):
+        self.times[stage] += seconds
+
+    def count(self, name, n=1):
+        self.counts[name] += int(n)
+
+    def as_dict(self):
+        """
+        Returns:
+            dict: {'times': {stage: seconds}, 'counts': {name: int}}
+        """
+        return {'times': dict(self.times), 'counts': dict(self.counts)}
+
+
+class NullMetrics(Metrics):
+    """
+    Stand in used when the metrics are turned off, recording nothing.
+    """
+    enabled = False
+
+    __timer = NullTimer()
+
+    def timer(self, stage):
+        return self.__timer
+
+    def add_time(self, stage, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+
+NULL = NullMetrics()
+
+
+def collector(value):
+    """
+    Resolve the METRICS parameter to what the procedures record into.
+
+    Args:
+        value: None, bool, or a Metrics
+
+    Returns:
+        Metrics
+    """
+    if isinstance(value, Metrics):
+        return value
+
+    if value:
+        return Metrics()
+
+    return NULL
@@ -1,6 +1,8 @@
 from collections import namedtuple
 import copy
 
+import numpy as np
+
 # TODO: establish standardize object for handling models used for general
 # regression purposes. This will truly make the code much more modular.
 
@@ -10,6 +12,120 @@ import copy
 # TODO: give better names to avoid model.model.predict nonsense
 FittedModel = namedtuple('FittedModel', ['fitted_model', 'residual', 'rmse'])
 
+# Names of the bands in the change models, in the order they are fit
+BAND_NAMES = ('blue', 'green', 'red', 'nir', 'swir1', 'swir2', 'thermal',
+              # indices
+              'nbr', 'ndvi', 'evi', 'evi2', 'brightness', 'greenness',
+              'wetness')
+
+# One segment of the change models as a record, for results kept in columns
+# rather than dicts. Models fit with fewer coefficients have the rest as
+# zeros, as they are in BandModels.
+SEGMENT_DTYPE = np.dtype([('start_day', np.int64),
+                          ('end_day', np.int64),
+                          ('break_day', np.int64),
+                          ('observation_count', np.int32),
+                          ('change_probability', np.float64),
+                          ('curve_qa', np.int32),
+                          ('rmse', np.float64, (len(BAND_NAMES),)),
+                          ('magnitude', np.float64, (len(BAND_NAMES),)),
+                          ('intercept', np.float64, (len(BAND_NAMES),)),
+                          ('coefficients', np.float64, (len(BAND_NAMES), 7))])
+
+
+class LinearModel(object):
+    """
+    Light-weight stand in for a fitted sklearn linear model, holding only
+    what is used by the rest of the procedures.
+    """
+    __slots__ = ('coef_', 'intercept_', 'n_iter_')
+
+    def __init__(self, coef, intercept, n_iter=None):
+        self.coef_ = coef
+        self.intercept_ = intercept
+        self.n_iter_ = n_iter
+
+    def predict(self, X):
+        return X.dot(self.coef_) + self.intercept_
+
+
+class BandModels(object):
+    """
+    Fitted models for all of the spectral bands, held in contiguous arrays
+    with a row for each band, so they can be worked on across the bands at
+    once.
+
+    Indexing by band gives back a FittedModel for that band, so this can still
+    be used wherever a list of FittedModel is expected.
+
+    Attributes:
+        coefficients: 2-d ndarray (bands x coefficients)
+        intercepts: 1-d ndarray
+        rmse: 1-d ndarray
+        residuals: 2-d ndarray (bands x observations)
+        n_iter: 1-d ndarray of the iterations used for each band, or None
+    """
+    __slots__ = ('coefficients', 'intercepts', 'rmse', 'residuals', 'n_iter')
+
+    def __init__(self, coefficients, intercepts, rmse, residuals, n_iter=None):
+        self.coefficients = coefficients
+        self.intercepts = intercepts
+        self.rmse = rmse
+        self.residuals = residuals
+        self.n_iter = n_iter
+
+    def __len__(self):
+        return self.coefficients.shape[0]
+
+    def __getitem__(self, band):
+        if not -len(self) <= band < len(self):
+            raise IndexError('band index out of range')
+
+        n_iter = None if self.n_iter is None else self.n_iter[band]
+
+        return FittedModel(fitted_model=LinearModel(self.coefficients[band],
+                                                    self.intercepts[band],
+                                                    n_iter),
+                           residual=self.residuals[band],
+                           rmse=self.rmse[band])
+
+    def predict(self, X):
+        """
+        Predict every band from the same design matrix.
+
+        Args:
+            X: 2-d ndarray (observations x coefficients)
+
+        Returns:
+            2-d ndarray (bands x observations)
+        """
+        predictions = self.coefficients[:, :X.shape[1]].dot(X.T)
+        predictions += self.intercepts[:, None]
+
+        return predictions
+
+
+def stack_models(fitted_models):
+    """
+    Stack the per band fitted models into arrays.
+
+    Args:
+        fitted_models: list of FittedModel, or a BandModels which is returned
+            as is
+
+    Returns:
+        BandModels
+    """
+    if isinstance(fitted_models, BandModels):
+        return fitted_models
+
+    return BandModels(
+        coefficients=np.array([m.fitted_model.coef_ for m in fitted_models]),
+        intercepts=np.array([m.fitted_model.intercept_
+                             for m in fitted_models]),
+        rmse=np.array([m.rmse for m in fitted_models]),
+        residuals=np.array([m.residual for m in fitted_models]))
+
 
 def results_to_changemodel(fitted_models, start_day, end_day, break_day,
                            magnitudes, observation_count, change_probability,
@@ -37,36 +153,54 @@ def results_to_changemodel(fitted_models, start_day, end_day, break_day,
         dict
 
     """
-    spectral_models = []
-    for ix, model in enumerate(fitted_models):
-        spectral = {'rmse': float(model.rmse),
-                    'coefficients': tuple(float(c) for c in
-                                          model.fitted_model.coef_),
-                    'intercept': float(model.fitted_model.intercept_),
-                    'magnitude': float(magnitudes[ix])}
-        spectral_models.append(spectral)
-
-    return {'start_day': int(start_day),
-            'end_day': int(end_day),
-            'break_day': int(break_day),
-            'observation_count': int(observation_count),
-            'change_probability': float(change_probability),
-            'curve_qa': int(curve_qa),
-            'blue': spectral_models[0],
-            'green': spectral_models[1],
-            'red': spectral_models[2],
-            'nir': spectral_models[3],
-            'swir1': spectral_models[4],
-            'swir2': spectral_models[5],
-            'thermal': spectral_models[6],
-            # indices
-            'nbr': spectral_models[7],
-            'ndvi': spectral_models[8],
-            'evi': spectral_models[9],
-            'evi2': spectral_models[10],
-            'brightness': spectral_models[11],
-            'greenness': spectral_models[12],
-            'wetness': spectral_models[13]}
+    models = stack_models(fitted_models)
+
+    result = {'start_day': int(start_day),
+              'end_day': int(end_day),
+              'break_day': int(break_day),
+              'observation_count': int(observation_count),
+              'change_probability': float(change_probability),
+              'curve_qa': int(curve_qa)}
+
+    for ix, name in enumerate(BAND_NAMES[:len(models)]):
+        result[name] = {'rmse': float(models.rmse[ix]),
+                        'coefficients': tuple(float(c) for c in
+                                              models.coefficients[ix]),
+                        'intercept': float(models.intercepts[ix]),
+                        'magnitude': float(magnitudes[ix])}
+
+    return result
+
+
+def results_to_segment(fitted_models, start_day, end_day, break_day,
+                       magnitudes, observation_count, change_probability,
+                       curve_qa):
+    """
+    Columnar counterpart of results_to_changemodel, consolidating the results
+    into a single SEGMENT_DTYPE record without building a dict for every band.
+
+    The record's fields are read the same way as the keys of the dict, such
+    as segment['break_day'], the band values being arrays in BAND_NAMES order.
+
+    Returns:
+        numpy.void record of SEGMENT_DTYPE
+    """
+    models = stack_models(fitted_models)
+    bands, coefs = models.coefficients.shape
+
+    segment = np.zeros((), dtype=SEGMENT_DTYPE)
+    segment['start_day'] = start_day
+    segment['end_day'] = end_day
+    segment['break_day'] = break_day
+    segment['observation_count'] = observation_count
+    segment['change_probability'] = change_probability
+    segment['curve_qa'] = curve_qa
+    segment['rmse'][:bands] = models.rmse
+    segment['magnitude'][:bands] = magnitudes
+    segment['intercept'][:bands] = models.intercepts
+    segment['coefficients'][:bands, :coefs] = models.coefficients
+
+    return segment[()]
 
 
 def results_fromprev(prev):
@@ -0,0 +1,152 @@
+"""
+Registry of the regression engines the procedures can use to model the
+spectral observations.
+
+FITTER_FN names one of the registered engines, or gives the fully qualified
+path to a fitting function. It is resolved once and cached, rather than on
+every call to detect. A path to a function that is not registered is called
+one band at a time, register it to declare anything more.
+
+Each engine declares how it can be called:
+    batched: fits every band in one call, receiving the 2-d
+        (bands, observations) block, rather than one band at a time
+    warm_start: accepts the coefficients of a previous fit to start from
+    incremental: lookforward can keep running sums for the segment with
+        lasso.IncrementalLasso in its place
+
+Registered engines:
+    lasso: the native lasso, matching sklearn's Lasso to within its
+        tolerance, all of the bands solved together (the default)
+    sklearn: sklearn's Lasso, one band at a time
+    ridge: closed form ridge regression, approximating the lasso for
+        throughput
+"""
+import functools
+import importlib
+
+from ccd.models import lasso
+from ccd.models import ridge
+from ccd.models import stack_models
+
+
+class Fitter(object):
+    """
+    A regression engine, called the same way for every engine and always
+    returning a BandModels.
+
+    Args:
+        name: name the engine is registered under, or the path it was
+            resolved from
+        fn: the fitting function, called as
+            fn(dates, spectra_obs, max_iter, avg_days_yr, num_coefficients)
+        batched: whether fn takes every band at once
+        warm_start: whether fn accepts a warm_start keyword
+        incremental: whether lasso.IncrementalLasso can stand in for fn
+    """
+    __slots__ = ('name', 'fn', 'batched', 'warm_start', 'incremental')
+
+    def __init__(self, name, fn, batched=True, warm_start=False,
+                 incremental=False):
+        self.name = name
+        self.fn = fn
+        self.batched = batched
+        self.warm_start = warm_start
+        self.incremental = incremental
+
+    def __call__(self, dates, spectra_obs, max_iter, avg_days_yr,
+                 num_coefficients, warm_start=None):
+        """
+        Fit every band.
+
+        Args:
+            dates: 1-d ndarray of ordinal dates
+            spectra_obs: 2-d ndarray (bands x observations)
+            max_iter: maximum number of iterations for iterative engines
+            avg_days_yr: average number of days in a year
+            num_coefficients: how many coefficients to use for the fit
+            warm_start: optional 2-d ndarray (bands x 7) of coefficients to
+                start from, ignored by engines that do not support it
+
+        Returns:
+            BandModels
+        """
+        if not self.batched:
+            return stack_models([self.fn(dates, obs, max_iter, avg_days_yr,
+                                         num_coefficients)
+                                 for obs in spectra_obs])
+
+        if warm_start is not None and self.warm_start:
+            return stack_models(self.fn(dates, spectra_obs, max_iter,
+                                        avg_days_yr, num_coefficients,
+                                        warm_start=warm_start))
+
+        return stack_models(self.fn(dates, spectra_obs, max_iter, avg_days_yr,
+                                    num_coefficients))
+
+    def __repr__(self):
+        return ('Fitter({!r}, batched={}, warm_start={}, incremental={})'
+                .format(self.name, self.batched, self.warm_start,
+                        self.incremental))
+
+
+FITTERS = {}
+
+
+def register(name, fn, batched=True, warm_start=False, incremental=False):
+    """
+    Register a fitting function under a name that can be given as FITTER_FN.
+
+    Args:
+        name: name for the engine
+        fn: the fitting function, see Fitter
+        batched: whether fn takes every band at once
+        warm_start: whether fn accepts a warm_start keyword
+        incremental: whether lasso.IncrementalLasso can stand in for fn
+
+    Returns:
+        Fitter
+    """
+    FITTERS[name] = Fitter(name, fn, batched, warm_start, incremental)
+    resolve.cache_clear()
+
+    return FITTERS[name]
+
+
+@functools.lru_cache(maxsize=None)
+def resolve(value):
+    """
+    Look up the engine for a FITTER_FN value.
+
+    A fully qualified path to a function that is already registered gives
+    that engine. Any other function is assumed to take one band at a time,
+    the same as FITTER_FN functions always have.
+
+    Args:
+        value: registered name, or fully qualified path to a fitting function
+            (e.g. 'ccd.models.lasso.fitted_models')
+
+    Returns:
+        Fitter
+
+    Raises:
+        ValueError: if the value can not be resolved to a function
+    """
+    if value in FITTERS:
+        return FITTERS[value]
+
+    try:
+        module, target = value.rsplit('.', 1)
+        fn = getattr(importlib.import_module(module), target)
+    except (ValueError, ImportError, AttributeError) as e:
+        raise ValueError('Unable to resolve fitter {}: {}'.format(value, e))
+
+    for fitter in FITTERS.values():
+        if fitter.fn is fn:
+            return fitter
+
+    return Fitter(value, fn, batched=False)
+
+
+register('lasso', lasso.fitted_models, warm_start=True, incremental=True)
+register('sklearn', lasso.fitted_model, batched=False)
+register('ridge', ridge.fitted_models)
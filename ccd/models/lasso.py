@@ -1,12 +1,17 @@
+from collections import OrderedDict
+
 from sklearn import linear_model
 import numpy as np
 
+from ccd.app import numpy_hashkey
+from ccd.models import BandModels
 from ccd.models import FittedModel
 from ccd.math_utils import calc_rmse
+from ccd.math_utils import sum_of_squares
 
-
-def __coefficient_cache_key(observation_dates):
-    return tuple(observation_dates)
+# Matches the sklearn.linear_model.Lasso defaults that have been used so far
+LASSO_ALPHA = 1.0
+LASSO_TOL = 1e-4
 
 
 def coefficient_matrix(dates, avg_days_yr, num_coefficients):
@@ -49,6 +54,91 @@ def coefficient_matrix(dates, avg_days_yr, num_coefficients):
     return matrix
 
 
+class DesignMatrixCache(object):
+    """
+    Least recently used cache of the full 8 coefficient Fourier matrices for
+    acquisition calendars, keyed on a hash of the date vector and bounded by
+    the bytes held.
+
+    Only worth looking up for dates that really do repeat, such as the
+    acquisition dates shared by every pixel of a block or a tile. The model
+    windows within a pixel almost never repeat, so their matrices are built
+    directly, or sliced from the calendar's rows. Matrices are stored read
+    only and sliced down for 4 or 6 coefficient models.
+
+    Args:
+        maxbytes: maximum number of bytes of matrices to hold on to, a
+            matrix larger than this is built but not kept
+    """
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.__matrices = OrderedDict()
+
+    def matrix(self, dates, avg_days_yr, num_coefficients=8):
+        """
+        Design matrix for the given dates, only using the columns needed for
+        the number of coefficients.
+
+        Args:
+            dates: 1-d ndarray of ordinal dates
+            avg_days_yr: average number of days in a year
+            num_coefficients: how many coefficients the matrix is for
+
+        Returns:
+            read only 2-d ndarray (dates x num_coefficients - 1)
+        """
+        dates = np.ascontiguousarray(dates)
+        key = (numpy_hashkey(dates), dates.dtype.str, dates.shape[0],
+               avg_days_yr)
+
+        matrix = self.__matrices.get(key)
+
+        if matrix is None:
+            self.misses += 1
+            matrix = coefficient_matrix(dates, avg_days_yr, 8)
+            matrix.flags.writeable = False
+
+            if matrix.nbytes <= self.maxbytes:
+                self.__matrices[key] = matrix
+                self.nbytes += matrix.nbytes
+
+            while self.nbytes > self.maxbytes:
+                self.nbytes -= self.__matrices.popitem(last=False)[1].nbytes
+        else:
+            self.hits += 1
+            self.__matrices.move_to_end(key)
+
+        return matrix[:, :num_coefficients - 1]
+
+    def info(self):
+        """
+        Returns:
+            dict of the hit and miss counts along with the current size
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.__matrices),
+                'nbytes': self.nbytes,
+                'maxbytes': self.maxbytes}
+
+    def clear(self):
+        """
+        Empty the cache and reset the counters.
+        """
+        self.__matrices.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by everything running in this process, a few calendars of a few
+# thousand dates each
+design_cache = DesignMatrixCache(maxbytes=4 * 2 ** 20)
+
+
 def fitted_model(dates, spectra_obs, max_iter, avg_days_yr, num_coefficients):
     """Create a fully fitted lasso model.
 
@@ -77,7 +167,334 @@ def fitted_model(dates, spectra_obs, max_iter, avg_days_yr, num_coefficients):
     return FittedModel(fitted_model=model, rmse=rmse, residual=residuals)
 
 
-def predict(model, dates, avg_days_yr):
-    coef_matrix = coefficient_matrix(dates, avg_days_yr, 8)
+def coordinate_descent(gram, xty, yty, alpha, max_iter, tol, coef_init=None):
+    """
+    Cyclic coordinate descent for the lasso, solving for many targets that
+    share the same design matrix at once.
+
+    This follows the same update order and stopping criteria (duality gap) as
+    sklearn's coordinate descent, but works off of the centered Gram matrix so
+    each sweep is independent of the number of observations. Targets are
+    dropped from the sweeps as they converge.
+
+    Starting from a previous solution, such as the fit of a window that has
+    only grown by a few observations, usually converges in fewer sweeps. The
+    result still satisfies the same duality gap, but is not necessarily
+    identical to the one found starting from zeros.
+
+    Args:
+        gram: 2-d ndarray, centered X^T X (coefficients x coefficients)
+        xty: 2-d ndarray, centered X^T y (coefficients x targets)
+        yty: 1-d ndarray, centered y^T y for each target
+        alpha: l1 penalty, already scaled by the number of observations
+        max_iter: maximum number of sweeps across the coefficients
+        tol: tolerance for the duality gap, relative to yty
+        coef_init: optional 2-d ndarray (coefficients x targets) to start the
+            coordinate descent from, defaults to zeros
+
+    Returns:
+        2-d ndarray: coefficients (coefficients x targets)
+        1-d ndarray: number of sweeps used for each target
+    """
+    num_coefs, num_targets = xty.shape
+
+    diag = gram.diagonal()
+    offdiag = gram.copy()
+    np.fill_diagonal(offdiag, 0)
+
+    # Columns with no variance (unused coefficients) are skipped entirely
+    rows = [(j, offdiag[j], diag[j]) for j in np.flatnonzero(diag)]
+
+    if coef_init is None:
+        coefs = np.zeros(shape=(num_coefs, num_targets))
+    else:
+        coefs = np.array(coef_init, dtype=float)
+        coefs[diag == 0] = 0
+
+    n_iter = np.full(num_targets, max_iter)
+    gap_tol = tol * yty
+
+    active = np.arange(num_targets)
+    w = coefs
+    q = xty
+
+    for iteration in range(max_iter):
+        w_prev = w.copy()
+
+        for j, row, d in rows:
+            tmp = q[j] - row.dot(w)
+            w[j] = (tmp - np.minimum(np.maximum(tmp, -alpha), alpha)) / d
+
+        w_max = np.max(np.abs(w), axis=0)
+        d_w_max = np.max(np.abs(w - w_prev), axis=0)
+
+        check = (w_max == 0) | (d_w_max < tol * w_max)
+        if iteration == max_iter - 1:
+            check[:] = True
+
+        if not check.any():
+            continue
+
+        # Duality gap, written in terms of the Gram matrix
+        gw = gram.dot(w)
+        dual_norm = np.max(np.abs(q - gw), axis=0)
+        wq = np.sum(w * q, axis=0)
+        r_norm2 = yty[active] - 2 * wq + np.sum(w * gw, axis=0)
+
+        const = np.where(dual_norm > alpha,
+                         alpha / np.maximum(dual_norm, alpha), 1.0)
+        gap = np.where(dual_norm > alpha, 0.5 * r_norm2 * (1 + const ** 2),
+                       r_norm2)
+        gap += alpha * np.sum(np.abs(w), axis=0) - const * (yty[active] - wq)
+
+        converged = check & (gap <= gap_tol[active])
+
+        if converged.any():
+            coefs[:, active] = w
+            n_iter[active[converged]] = iteration + 1
+            active = active[~converged]
+
+            if active.size == 0:
+                break
+
+            w = coefs[:, active]
+            q = xty[:, active]
+
+    if active.size:
+        coefs[:, active] = w
+
+    return coefs, n_iter
+
+
+def fitted_models(dates, spectra_obs, max_iter, avg_days_yr, num_coefficients,
+                  warm_start=None):
+    """Create fully fitted lasso models for all spectral bands at once.
+
+    Produces the same models as calling fitted_model for each band, but the
+    design matrix and its Gram matrix are only built once and all the bands
+    are solved together.
+
+    Args:
+        dates: list or ordinal observation dates
+        spectra_obs: 2-d array of values corresponding to the observation
+            dates, each band as a row
+        max_iter: maximum number of iterations that the coefficients
+            undergo to find the convergence point.
+        avg_days_yr: average number of days in a year
+        num_coefficients: how many coefficients to use for the fit
+        warm_start: optional 2-d ndarray (bands x 7) of coefficients to start
+            the coordinate descent from, such as BandModels.coefficients from
+            a previous fit of the same bands
+
+    Returns:
+        BandModels
+    """
+    coef_matrix = coefficient_matrix(dates, avg_days_yr, num_coefficients)
+    coef_matrix = coef_matrix[:, :num_coefficients - 1]
+    spectra_obs = np.asarray(spectra_obs, dtype=float)
+
+    x_offset = np.mean(coef_matrix, axis=0)
+    y_offset = np.mean(spectra_obs, axis=1)
+    x_centered = coef_matrix - x_offset
+    y_centered = spectra_obs - y_offset[:, None]
+
+    # sklearn scales the penalty by the number of observations
+    solved, n_iter = coordinate_descent(x_centered.T.dot(x_centered),
+                                        x_centered.T.dot(y_centered.T),
+                                        sum_of_squares(y_centered, axis=1),
+                                        LASSO_ALPHA * coef_matrix.shape[0],
+                                        max_iter, LASSO_TOL,
+                                        warm_coefs(warm_start,
+                                                   num_coefficients))
+
+    intercepts = y_offset - x_offset.dot(solved)
+    residuals = spectra_obs - (coef_matrix.dot(solved).T + intercepts[:, None])
+
+    # Unused coefficients are reported as zeros
+    coefs = np.zeros(shape=(7, spectra_obs.shape[0]))
+    coefs[:solved.shape[0]] = solved
+
+    return band_models(coefs, intercepts, n_iter, residuals, num_coefficients)
+
+
+def warm_coefs(warm_start, num_coefficients):
+    """
+    Arrange the coefficients of a previous fit as a starting point for
+    coordinate_descent.
+
+    Args:
+        warm_start: 2-d ndarray (bands x 7) of coefficients, or None
+        num_coefficients: how many coefficients are being used for the fit
+
+    Returns:
+        2-d ndarray (coefficients x bands), or None
+    """
+    if warm_start is None:
+        return None
+
+    return np.asarray(warm_start)[:, :num_coefficients - 1].T
+
+
+def band_models(coefs, intercepts, n_iter, residuals, num_coefficients):
+    """
+    Wrap up solved coefficients, one column per band, into a BandModels.
+
+    Args:
+        coefs: 2-d ndarray (coefficients x bands)
+        intercepts: 1-d ndarray, one per band
+        n_iter: 1-d ndarray, iterations used for each band
+        residuals: 2-d ndarray (bands x observations)
+        num_coefficients: how many coefficients were used for the fit
+
+    Returns:
+        BandModels
+    """
+    dof = residuals.shape[1] - num_coefficients
+    rmses = (sum_of_squares(residuals, axis=1) / dof) ** 0.5
+
+    return BandModels(coefficients=np.ascontiguousarray(coefs.T),
+                      intercepts=intercepts,
+                      rmse=rmses,
+                      residuals=residuals,
+                      n_iter=n_iter)
+
+
+class IncrementalLasso(object):
+    """
+    Multi-band lasso fits over a window of observations that grows a few
+    observations at a time.
+
+    Running sums of X, X^T X, y, X^T y and y^T y for the full 8 coefficient
+    design are updated as observations are added, and the centered
+    Gram matrix is derived from them when a fit is requested. Solving is then
+    independent of how many observations are in the window, only the
+    residuals still touch every observation.
+
+    The date column is offset by an origin date to keep the sums well
+    conditioned; the intercepts are reported against the actual dates.
+
+    When warm_start is set, each fit starts the coordinate descent from the
+    coefficients of the previous one, which the window has usually only grown
+    by a few observations since.
+
+    Args:
+        num_bands: number of spectral bands being fit
+        capacity: maximum number of observations the window will hold
+        max_iter: maximum number of iterations for the coordinate descent
+        avg_days_yr: average number of days in a year
+        origin: ordinal date used to offset the date column
+        warm_start: whether to start each fit from the previous coefficients
+    """
+    def __init__(self, num_bands, capacity, max_iter, avg_days_yr, origin,
+                 warm_start=False):
+        self.max_iter = max_iter
+        self.warm_start = warm_start
+        self.coefs = None
+        self.avg_days_yr = avg_days_yr
+        self.origin = origin
+        self.count = 0
+
+        self.design = np.zeros(shape=(capacity, 7))
+        self.spectra = np.zeros(shape=(num_bands, capacity))
+
+        self.x_sum = np.zeros(7)
+        self.xtx = np.zeros(shape=(7, 7))
+        self.y_sum = np.zeros(num_bands)
+        self.xty = np.zeros(shape=(7, num_bands))
+        self.yty = np.zeros(num_bands)
+
+    def __update(self, rows, spectra):
+        self.x_sum += np.sum(rows, axis=0)
+        self.xtx += rows.T.dot(rows)
+        self.y_sum += np.sum(spectra, axis=1)
+        self.xty += rows.T.dot(spectra.T)
+        self.yty += sum_of_squares(spectra, axis=1)
+
+    def extend(self, dates, spectra_obs, design=None):
+        """
+        Add observations onto the end of the window.
+
+        Args:
+            dates: 1-d array of ordinal dates
+            spectra_obs: 2-d array (bands x observations)
+            design: optional 2-d array of the 8 coefficient design matrix rows
+                for the dates, such as MaskedObservations.design, built from
+                the dates when not given
+        """
+        if design is None:
+            design = coefficient_matrix(dates, self.avg_days_yr, 8)
+
+        rows = design - [self.origin, 0, 0, 0, 0, 0, 0]
+        spectra_obs = np.asarray(spectra_obs, dtype=float)
+
+        stop = self.count + rows.shape[0]
+        self.design[self.count:stop] = rows
+        self.spectra[:, self.count:stop] = spectra_obs
+        self.count = stop
+
+        self.__update(rows, spectra_obs)
+
+    def fitted_models(self, num_coefficients):
+        """
+        Fit the current window.
+
+        Args:
+            num_coefficients: how many coefficients to use for the fit
+
+        Returns:
+            BandModels
+        """
+        num_obs = self.count
+        cols = num_coefficients - 1
+
+        x_mean = self.x_sum[:cols] / num_obs
+        y_mean = self.y_sum / num_obs
+
+        gram = self.xtx[:cols, :cols] - num_obs * np.outer(x_mean, x_mean)
+        xty = self.xty[:cols] - num_obs * np.outer(x_mean, y_mean)
+        yty = self.yty - num_obs * y_mean ** 2
+
+        coef_init = None
+        if self.warm_start and self.coefs is not None:
+            coef_init = self.coefs[:cols]
+
+        solved, n_iter = coordinate_descent(gram, xty, yty,
+                                            LASSO_ALPHA * num_obs,
+                                            self.max_iter, LASSO_TOL,
+                                            coef_init)
+
+        coefs = np.zeros(shape=(7, self.y_sum.shape[0]))
+        coefs[:cols] = solved
+        self.coefs = coefs
+        intercepts = y_mean - x_mean.dot(solved)
+
+        fitted = self.design[:num_obs].dot(coefs).T
+        residuals = self.spectra[:, :num_obs] - fitted - intercepts[:, None]
+
+        return band_models(coefs, intercepts - self.origin * coefs[0],
+                           n_iter, residuals, num_coefficients)
+
+
+def predict(model, dates, avg_days_yr, design=None):
+    """
+    Predict values for the given dates.
+
+    Args:
+        model: FittedModel for a single band, or BandModels to predict all of
+            the bands at once
+        dates: 1-d ndarray of ordinal dates
+        avg_days_yr: average number of days in a year
+        design: optional 2-d ndarray of the 8 coefficient design matrix rows
+            for the dates, built from the dates when not given
+
+    Returns:
+        1-d ndarray for a single band, 2-d (bands x dates) for BandModels
+    """
+    coef_matrix = design
+    if coef_matrix is None:
+        coef_matrix = coefficient_matrix(dates, avg_days_yr, 8)
+
+    if isinstance(model, BandModels):
+        return model.predict(coef_matrix)
 
     return model.fitted_model.predict(coef_matrix)
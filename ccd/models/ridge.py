@@ -0,0 +1,75 @@
+"""
+Closed form ridge regression across all of the spectral bands at once.
+
+This is a faster, approximate stand in for the lasso. There is no coordinate
+descent, every band is solved together from the same centered Gram matrix
+with a single LAPACK call. A small l2 penalty takes the place of the l1
+penalty, so the coefficients are shrunk slightly rather than some being set
+to zero. The segments found may differ from those found with the lasso.
+"""
+import numpy as np
+
+from ccd.models.lasso import band_models
+from ccd.models.lasso import coefficient_matrix
+
+# Penalty per observation. Kept light, heavier penalties shrink the harmonic
+# coefficients well past what the lasso does and find different breaks
+RIDGE_ALPHA = 0.001
+
+
+def solve(gram, xty, alpha):
+    """
+    Solve the ridge normal equations for many targets that share the same
+    design matrix.
+
+    Args:
+        gram: 2-d ndarray, centered X^T X (coefficients x coefficients)
+        xty: 2-d ndarray, centered X^T y (coefficients x targets)
+        alpha: l2 penalty, already scaled by the number of observations
+
+    Returns:
+        2-d ndarray: coefficients (coefficients x targets)
+    """
+    gram = gram + alpha * np.eye(gram.shape[0])
+
+    return np.linalg.solve(gram, xty)
+
+
+def fitted_models(dates, spectra_obs, max_iter, avg_days_yr, num_coefficients):
+    """Create fully fitted ridge models for all spectral bands at once.
+
+    Args:
+        dates: list or ordinal observation dates
+        spectra_obs: 2-d array of values corresponding to the observation
+            dates, each band as a row
+        max_iter: unused, there is nothing iterative about the fit. Kept so
+            this can be used in place of the lasso
+        avg_days_yr: average number of days in a year
+        num_coefficients: how many coefficients to use for the fit
+
+    Returns:
+        BandModels
+    """
+    coef_matrix = coefficient_matrix(dates, avg_days_yr, num_coefficients)
+    coef_matrix = coef_matrix[:, :num_coefficients - 1]
+    spectra_obs = np.asarray(spectra_obs, dtype=float)
+
+    x_offset = np.mean(coef_matrix, axis=0)
+    y_offset = np.mean(spectra_obs, axis=1)
+    x_centered = coef_matrix - x_offset
+    y_centered = spectra_obs - y_offset[:, None]
+
+    solved = solve(x_centered.T.dot(x_centered),
+                   x_centered.T.dot(y_centered.T),
+                   RIDGE_ALPHA * coef_matrix.shape[0])
+
+    intercepts = y_offset - x_offset.dot(solved)
+    residuals = spectra_obs - (coef_matrix.dot(solved).T + intercepts[:, None])
+
+    # Unused coefficients are reported as zeros
+    coefs = np.zeros(shape=(7, spectra_obs.shape[0]))
+    coefs[:solved.shape[0]] = solved
+
+    return band_models(coefs, intercepts,
+                       np.zeros(spectra_obs.shape[0], dtype=int),
+                       residuals, num_coefficients)
@@ -11,6 +11,11 @@ Reference:
 Run this file to test performance gains. Implementation is ~3x faster than
 statsmodels and can reach ~4x faster if Numba is available to accelerate.
 
+When Numba is installed, the weight, scale and fitting functions along with
+the IRLS loop itself are wrapped for compilation at import time, and compiled
+on their first call, or loaded from Numba's on disk cache. Otherwise the same
+functions run as plain NumPy.
+
 """
 # Don't alias to ``np`` until fix is implemented
 # https://github.com/numba/numba/issues/1559
@@ -18,13 +23,29 @@ import numpy
 import sklearn
 import scipy
 
-# from yatsm.accel import try_jit
+try:
+    import numba
+except ImportError:
+    numba = None
 
 EPS = numpy.finfo('float').eps
 
 
+def try_jit(func):
+    """
+    Wrap the function for nopython mode when Numba is available, otherwise
+    hand it back untouched. Which one is decided at import, the function is
+    only compiled the first time it is called, for the argument types it is
+    called with
+    """
+    if numba is None:
+        return func
+
+    return numba.njit(cache=True)(func)
+
+
 # Weight scaling methods
-# @try_jit(nopython=True)
+@try_jit
 def bisquare(resid, c=4.685):
     """
     Returns weighting for each residual using bisquare weight function
@@ -43,7 +64,7 @@ def bisquare(resid, c=4.685):
     return (numpy.abs(resid) < c) * (1 - (resid / c) ** 2) ** 2
 
 
-# @try_jit(nopython=True)
+@try_jit
 def mad(x, c=0.6745):
     """
     Returns Median-Absolute-Deviation (MAD) of some data
@@ -59,22 +80,58 @@ def mad(x, c=0.6745):
     Reference:
         http://en.wikipedia.org/wiki/Median_absolute_deviation
     """
-    # Return median absolute deviation adjusted sigma
-    rs = numpy.sort(numpy.abs(x))
-    return numpy.median(rs[4:]) / c
+    # Return median absolute deviation adjusted sigma, leaving out the 4
+    # smallest absolute values. Only the middle order statistics of what is
+    # left are needed, so they are selected rather than sorting everything.
+    rs = numpy.abs(x)
+    count = rs.shape[0] - 4
+    if count <= 0:
+        return numpy.nan
+
+    upper = 4 + count // 2
+    rs = numpy.partition(rs, upper)
+
+    if count % 2:
+        return rs[upper] / c
+
+    return (numpy.max(rs[:upper]) + rs[upper]) / 2 / c
 
 #    return numpy.median(numpy.fabs(x)) / c
 
 
+def mad_rows(x, c=0.6745):
+    """
+    Returns the Median-Absolute-Deviation (MAD) of each row, the same as
+    calling `mad` on every row
+
+    Args:
+        x (np.ndarray): 2D observations (e.g., residuals), one set per row
+        c (float): scale factor to get to ~standard normal (default: 0.6745)
+
+    Returns:
+        np.ndarray: MAD 'robust' standard deviation estimate for each row
+    """
+    rs = numpy.abs(x)
+    count = rs.shape[1] - 4
+    if count <= 0:
+        return numpy.full(rs.shape[0], numpy.nan)
+
+    upper = 4 + count // 2
+    rs = numpy.partition(rs, upper, axis=1)
+
+    if count % 2:
+        return rs[:, upper] / c
+
+    return (numpy.max(rs[:, :upper], axis=1) + rs[:, upper]) / 2 / c
+
+
 # UTILITY FUNCTIONS
-# @try_jit(nopython=True)
+@try_jit
 def _check_converge(x0, x, tol=1e-8):
-    return not numpy.any(numpy.fabs(x0 - x > tol))
+    return not numpy.any(x0 - x > tol)
 
 
-# Broadcast on sw prevents nopython
-# TODO: check implementation https://github.com/numba/numba/pull/1542
-# @try_jit()
+@try_jit
 def _weight_fit(X, y, w):
     """
     Apply a weighted OLS fit to data
@@ -90,16 +147,125 @@ def _weight_fit(X, y, w):
     """
     sw = numpy.sqrt(w)
 
-    Xw = X * sw[:, None]
+    Xw = X * sw.reshape((-1, 1))
     yw = y * sw
 
-    beta, _, _, _ = numpy.linalg.lstsq(Xw, yw, rcond=None)
+    # Same cutoff as rcond=None, which Numba does not take
+    beta = numpy.linalg.lstsq(Xw, yw, EPS * max(X.shape[0], X.shape[1]))[0]
 
     resid = y - numpy.dot(X, beta)
 
     return beta, resid
 
 
+@try_jit
+def _irls(X, y, adjfactor, coef, scale, tune, scale_constant, update_scale,
+          maxiter, tol):
+    """
+    Iteratively reweighted least squares using the bisquare weights and the
+    mad scale estimate
+
+    Args:
+        X (ndarray): independent variables
+        y (ndarray): dependent variable
+        adjfactor (ndarray): leverage adjustment for each observation
+        coef (ndarray): starting coefficients
+        scale (float): starting scale
+        tune (float): tuning constant for the bisquare weights
+        scale_constant (float): normalization constant for mad
+        update_scale (bool): update the scale across iterations
+        maxiter (int): maximum number of iterations
+        tol (float): convergence tolerance of estimate
+
+    Returns:
+        tuple: coefficients, scale, weights and the number of iterations
+
+    """
+    weights = numpy.ones(y.shape[0])
+    floor = EPS * numpy.std(y)
+
+    iteration = 1
+    converged = False
+    while not converged and iteration < maxiter:
+        _coef = coef.copy()
+        resid = (y - numpy.dot(X, _coef)) * adjfactor
+
+        if update_scale:
+            scale = max(floor, mad(resid, scale_constant))
+
+        weights = bisquare(resid / scale, tune)
+        coef, resid = _weight_fit(X, y, weights)
+
+        iteration += 1
+        converged = _check_converge(coef, _coef, tol)
+
+    return coef, scale, weights, iteration
+
+
+def _weight_fits(X, Y, W):
+    """
+    Apply weighted OLS fits for many dependent variables that share the same
+    design matrix, each with its own observation weights
+
+    The fits are solved together through their small weighted normal
+    equations. Should any of them be singular, they are all solved through a
+    stacked SVD instead, treating small singular values the same way as
+    `numpy.linalg.lstsq`.
+
+    Args:
+        X (ndarray): independent variables (n_obs x n_features)
+        Y (ndarray): dependent variables (n_targets x n_obs)
+        W (ndarray): observation weights (n_targets x n_obs)
+
+    Returns:
+        tuple: coefficients (n_targets x n_features) and residuals
+            (n_targets x n_obs)
+
+    """
+    XW = X.T[None, :, :] * W[:, None, :]
+
+    try:
+        XWY = numpy.einsum('tfn,tn->tf', XW, Y)
+        beta = numpy.linalg.solve(XW.dot(X), XWY[:, :, None])
+        beta = beta[:, :, 0]
+    except numpy.linalg.LinAlgError:
+        beta = None
+
+    if beta is None or not numpy.all(numpy.isfinite(beta)):
+        sw = numpy.sqrt(W)
+        u, s, vt = numpy.linalg.svd(X[None, :, :] * sw[:, :, None],
+                                    full_matrices=False)
+
+        cutoff = EPS * max(X.shape) * s[:, :1]
+        s_inv = numpy.divide(1, s, out=numpy.zeros_like(s), where=s > cutoff)
+
+        uty = numpy.einsum('tnk,tn->tk', u, Y * sw)
+        beta = numpy.einsum('tkf,tk->tf', vt, s_inv * uty)
+
+    resid = Y - beta.dot(X.T)
+
+    return beta, resid
+
+
+def _leverage_adjustment(X):
+    """
+    Factor used to adjust the residuals for the leverage of each observation
+
+    Args:
+        X (ndarray): independent variables
+
+    Returns:
+        ndarray: adjustment factor for each observation
+
+    """
+    Q, R = scipy.linalg.qr(X)
+    E = X.dot(numpy.linalg.inv(R[0:X.shape[1],0:X.shape[1]]))
+    const_h= numpy.ones(X.shape[0])*0.9999
+
+    h = numpy.minimum(const_h,numpy.sum(E*E,axis=1))
+    return numpy.divide(1,numpy.sqrt(1-h))
+
+
 # Robust regression
 class RLM(sklearn.base.BaseEstimator):
     """ Robust Linear Model using Iterative Reweighted Least Squares (RIRLS)
@@ -146,6 +312,11 @@ class RLM(sklearn.base.BaseEstimator):
         self.coef_ = None
         self.intercept_ = 0.0
 
+    def _default_weights(self):
+        """ Whether the bisquare weights and mad scale are in use, the only
+        ones the _irls kernel handles """
+        return self.M is bisquare and self.scale_est is mad
+
     def fit(self, X, y):
         """ Fit a model predicting y from X design matrix
 
@@ -158,16 +329,14 @@ class RLM(sklearn.base.BaseEstimator):
                 chaining
 
         """
+        X = numpy.asarray(X, dtype=float)
+        y = numpy.asarray(y, dtype=float)
+
         self.coef_, resid = _weight_fit(X, y, numpy.ones_like(y))
         self.scale = self.scale_est(resid, c=self.scale_constant)
 
 
-        Q, R = scipy.linalg.qr(X)
-        E = X.dot(numpy.linalg.inv(R[0:X.shape[1],0:X.shape[1]]))
-        const_h= numpy.ones(X.shape[0])*0.9999
-
-        h = numpy.minimum(const_h,numpy.sum(E*E,axis=1))
-        adjfactor = numpy.divide(1,numpy.sqrt(1-h))
+        adjfactor = _leverage_adjustment(X)
         # self.coef_ = numpy.linalg.lstsq(R,(Q.T.dot(y)))[0]
         # self.coef_, resid = _weight_fit(X, y, numpy.ones_like(y))
         # U,s,v = numpy.linalg.svd(X)
@@ -176,6 +345,13 @@ class RLM(sklearn.base.BaseEstimator):
         if self.scale < EPS:
             return self
 
+        if self._default_weights():
+            self.coef_, self.scale, self.weights, _ = _irls(
+                X, y, adjfactor, self.coef_, self.scale, self.tune,
+                self.scale_constant, self.update_scale, self.maxiter,
+                self.tol)
+            return self
+
         iteration = 1
         converged = 0
         while not converged and iteration < self.maxiter:
@@ -219,3 +395,105 @@ class RLM(sklearn.base.BaseEstimator):
                 (self.__class__.__name__,
                  numpy.array_str(self.coef_, precision=4),
                  self.intercept_))
+
+
+class MultiRLM(RLM):
+    """ Robust Linear Model for many dependent variables at once
+
+    Runs the same iteratively reweighted least squares as `RLM` for each of
+    the dependent variables, but the leverage adjustment for the shared design
+    matrix is only worked out once and the weighted fits for every variable
+    still iterating are solved together. Each variable keeps its own weights,
+    scale and convergence, so the coefficients are the same as fitting an
+    `RLM` to each one.
+
+    Args:
+        see `RLM`
+
+    Attributes:
+        coef_ (np.ndarray): 2D array of model coefficients
+            (n_targets x n_features)
+        scale (np.ndarray): 1D array of the final scale for each target
+        n_iter (np.ndarray): 1D array of iterations used for each target
+
+    """
+
+    def _scale_rows(self, resid):
+        """ Scale estimate for each row of residuals """
+        if self.scale_est is mad:
+            return mad_rows(resid, c=self.scale_constant)
+
+        return numpy.array([self.scale_est(r, c=self.scale_constant)
+                            for r in resid])
+
+    def fit(self, X, Y):
+        """ Fit models predicting each row of Y from X design matrix
+
+        Args:
+            X (np.ndarray): 2D (n_obs x n_features) design matrix
+            Y (np.ndarray): 2D (n_targets x n_obs) dependent variables
+
+        Returns:
+            object: return `self` with model results stored for method
+                chaining
+
+        """
+        Y = numpy.asarray(Y, dtype=float)
+
+        self.coef_, resid = _weight_fits(X, Y, numpy.ones_like(Y))
+        self.scale = self._scale_rows(resid)
+        self.n_iter = numpy.ones(Y.shape[0], dtype=int)
+
+        # Targets with no spread to their residuals are done after OLS
+        active = self.scale >= EPS
+        if not active.any():
+            return self
+
+        adjfactor = _leverage_adjustment(X)
+
+        # Compiled, the single target kernel is quicker than the stacked fits
+        if numba is not None and self._default_weights():
+            X = numpy.asarray(X, dtype=float)
+
+            for idx in numpy.flatnonzero(active):
+                fit = _irls(X, Y[idx], adjfactor, self.coef_[idx],
+                            self.scale[idx], self.tune, self.scale_constant,
+                            self.update_scale, self.maxiter, self.tol)
+                self.coef_[idx], self.scale[idx], _, self.n_iter[idx] = fit
+
+            return self
+
+        floor = EPS * numpy.std(Y, axis=1)
+
+        iteration = 1
+        while active.any() and iteration < self.maxiter:
+            idx = numpy.flatnonzero(active)
+            _coef = self.coef_[idx]
+            resid = (Y[idx] - _coef.dot(X.T)) * adjfactor
+
+            if self.update_scale:
+                self.scale[idx] = numpy.maximum(
+                    floor[idx],
+                    self._scale_rows(resid))
+
+            weights = self.M(resid / self.scale[idx][:, None], c=self.tune)
+            self.coef_[idx], _ = _weight_fits(X, Y[idx], weights)
+
+            iteration += 1
+            self.n_iter[idx] = iteration
+            # Same (one sided) check as _check_converge, for each target
+            active[idx] = numpy.any(self.coef_[idx] - _coef > self.tol, axis=1)
+
+        return self
+
+    def predict(self, X):
+        """ Predict yhat for every target using model
+
+        Args:
+            X (np.ndarray): 2D (n_obs x n_features) design matrix
+
+        Returns:
+            np.ndarray: 2D yhat prediction (n_targets x n_obs)
+
+        """
+        return self.coef_.dot(X.T)
@@ -45,23 +45,21 @@ def tmask(dates, observations, variogram, bands, t_const, avg_days_yr):
     """
     # variogram = calculate_variogram(observations)
     # Time and expected values using a four-part matrix of coefficients.
-    # regression = lm.LinearRegression()
-    regression = robust_fit.RLM(maxiter=5)
+    # The robust fits for all of the bands share the same matrix, so they are
+    # run together.
+    regression = robust_fit.MultiRLM(maxiter=5)
 
     tmask_matrix = tmask_coefficient_matrix(dates, avg_days_yr)
 
-    # Accumulator for outliers. This starts off as a list of False values
-    # because we don't assume anything is an outlier.
-    _, sample_count = observations.shape
-    outliers = np.zeros(sample_count, dtype=bool)
+    band_obs = observations[bands]
+    fit = regression.fit(tmask_matrix, band_obs)
+    predicted = fit.predict(tmask_matrix)
 
-    # For each band, determine if the delta between predeicted and actual
+    # For each band, determine if the delta between predicted and actual
     # values exceeds the threshold. If it does, then it is an outlier.
-    for band_ix in bands:
-        fit = regression.fit(tmask_matrix, observations[band_ix])
-        predicted = fit.predict(tmask_matrix)
-        outliers += np.abs(predicted - observations[band_ix]) > variogram[band_ix] * t_const
+    thresholds = variogram[bands] * t_const
+    outliers = np.abs(predicted - band_obs) > thresholds[:, None]
 
     # Keep all observations that aren't outliers.
-    return outliers
+    return np.any(outliers, axis=0)
     # return dates[~outliers], observations[:, ~outliers]
@@ -0,0 +1,140 @@
+"""
+Process pool runner for change detection across a chip or tile of pixels.
+
+Pixels are split into contiguous chunks, each chunk being run through
+ccd.detect_block inside a worker process. Workers are initialized once with
+the shared dates and parameters, so only the per-chunk spectra and QA are
+sent to them, and whole chunks of results are sent back.
+
+Results are streamed back in completion order, along with the index of the
+pixel they belong to, so callers can write them out as they arrive.
+"""
+import logging
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+import os
+
+import numpy as np
+
+import ccd
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+
+log = logging.getLogger(__name__)
+
+# Worker process state, populated once by the pool initializer.
+__worker = {}
+
+
+def __initialize(dates, params):
+    """
+    Pool initializer, runs once in each worker process.
+
+    Importing ccd at the module level means numpy, scipy and sklearn are
+    already loaded by the time this runs. The BLAS thread pools are pinned to
+    a single thread as the parallelism comes from the processes themselves.
+    """
+    if threadpool_limits is not None:
+        __worker['limits'] = threadpool_limits(limits=1)
+
+    __worker['dates'] = dates
+    __worker['params'] = params
+
+
+def __detect_chunk(start, spectra, qas, prev_results):
+    """
+    Run one chunk of pixels within a worker process.
+
+    Returns:
+        int: index of the first pixel in the chunk
+        list: change detection results for each pixel in the chunk
+    """
+    return start, ccd.detect_block(__worker['dates'], spectra, qas,
+                                   params=__worker['params'],
+                                   prev_results=prev_results)
+
+
+def chunk_slices(pixel_count, chunk_size):
+    """
+    Split the pixel axis into contiguous chunks.
+
+    Args:
+        pixel_count: total number of pixels
+        chunk_size: number of pixels per chunk, the last chunk may be smaller
+
+    Returns:
+        list of slice objects
+    """
+    return [slice(start, min(start + chunk_size, pixel_count))
+            for start in range(0, pixel_count, chunk_size)]
+
+
+def detect_tile(dates, spectra_cube, qas_cube, params=None, prev_results=None,
+                chunk_size=100, workers=None, max_pending=None):
+    """
+    Run change detection across a block of pixels using a process pool.
+
+    Args:
+        dates: 1d-array of ordinal date values shared by every pixel
+        spectra_cube: 3d-array shaped (bands, time, pixels), the bands being
+            in the same order as the ccd.detect arguments
+        qas_cube: 2d-array shaped (time, pixels) of qa band values
+        params: python dictionary to change module wide processing
+            parameters
+        prev_results: optional sequence, one previous set of results per
+            pixel, to be updated with new observations
+        chunk_size: number of pixels handed to a worker at a time
+        workers: number of worker processes, defaults to the cpu count
+        max_pending: maximum number of chunks queued at once, this bounds the
+            memory held by the pool, defaults to twice the number of workers
+
+    Yields:
+        tuple: (pixel index, change detection results) in completion order
+    """
+    dates = np.asarray(dates)
+    pixel_count = qas_cube.shape[1]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if max_pending is None:
+        max_pending = 2 * workers
+
+    slices = iter(chunk_slices(pixel_count, chunk_size))
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=__initialize,
+                             initargs=(dates, params)) as pool:
+        pending = set()
+
+        def submit(chunk):
+            prev = None if prev_results is None else prev_results[chunk]
+            pending.add(pool.submit(__detect_chunk, chunk.start,
+                                    spectra_cube[:, :, chunk],
+                                    qas_cube[:, chunk],
+                                    prev))
+
+        for chunk in slices:
+            submit(chunk)
+
+            if len(pending) >= max_pending:
+                break
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                start, results = future.result()
+                log.debug('Chunk starting at pixel %s complete', start)
+
+                for offset, result in enumerate(results):
+                    yield start + offset, result
+
+                chunk = next(slices, None)
+                if chunk is not None:
+                    submit(chunk)
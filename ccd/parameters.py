@@ -82,11 +82,39 @@ defaults = {
     ############################
     # Values related to model fitting
     ############################
-    'FITTER_FN': 'ccd.models.lasso.fitted_model',
+    # Registered fitter name from ccd.models.fitters, 'lasso', 'sklearn' or
+    # 'ridge', or the fully qualified path to a fitting function
+    'FITTER_FN': 'lasso',
     'LASSO_MAX_ITER': 1000,
 
+    # When using the native lasso, lookforward keeps running Gram sums for the
+    # segment being extended instead of refitting the full window each time
+    'FIT_INCREMENTAL': True,
+
+    # Start each lookforward refit of the native lasso from the coefficients
+    # of the previous one. The fits converge to the same tolerance, but are
+    # not bit for bit the same as starting from zeros, so the final models of
+    # each segment are refit cold
+    'FIT_WARM_START': True,
+
+    # Only fit the DETECTION_BANDS while searching for breaks, all of the bands
+    # are fit once the segment is final
+    'FIT_DETECTION_ONLY': True,
+
+    # Return the change models as a structured array of
+    # ccd.models.SEGMENT_DTYPE and the processing mask as a boolean array,
+    # rather than dicts and a list of ints, see ccd.columnar
+    'COLUMNAR_RESULTS': False,
+
     ############################
     # Ordinal date related statistical calculations
     ############################
-    'STAT_ORD': 736694
+    'STAT_ORD': 736694,
+
+    ############################
+    # Instrumentation
+    ############################
+    # Time the stages and count fits and outliers, see ccd.metrics. True
+    # returns them with the results, a ccd.metrics.Metrics collects into it
+    'METRICS': False
 }
@@ -23,6 +23,8 @@ For more information please refer to the pyccd Algorithm Description Document.
 import logging
 import numpy as np
 
+from ccd import indices
+from ccd import metrics
 from ccd import qa
 
 from ccd.change import adjustpeek
@@ -36,14 +38,17 @@ from ccd.change import enough_samples
 from ccd.change import enough_time
 from ccd.change import find_closest_doy
 from ccd.change import jumpstart
+from ccd.change import MaskedObservations
 from ccd.change import prevmask
+from ccd.change import search_bands
 from ccd.change import span
 from ccd.change import stable
 from ccd.change import statmask
-from ccd.change import update_processing_mask
 
 from ccd.models import results_to_changemodel
+from ccd.models import results_to_segment
 from ccd.models import results_fromprev
+from ccd.models import lasso
 from ccd.models import tmask
 
 from ccd.math_utils import adjusted_variogram
@@ -69,7 +74,7 @@ def procedure_fromprev(prev_results, proc_params):
         the corresponding function that will be use to generate
          the curves
     """
-    if prev_results['change_models']:
+    if len(prev_results['change_models']):
         if prev_results['change_models'][0]['curve_qa'] == proc_params['CURVE_QA']['PERSIST_SNOW']:
             return permanent_snow_procedure
         if prev_results['change_models'][0]['curve_qa'] == proc_params['CURVE_QA']['INSUF_CLEAR']:
@@ -78,6 +83,25 @@ def procedure_fromprev(prev_results, proc_params):
     return standard_procedure
 
 
+def changemodel(proc_params, **results):
+    """
+    Consolidate the results for a segment, as a dict from
+    results_to_changemodel or, with COLUMNAR_RESULTS set, as a record from
+    results_to_segment.
+
+    Args:
+        proc_params: dictionary of processing parameters
+        results: keyword arguments of results_to_changemodel
+
+    Returns:
+        dict or numpy.void record
+    """
+    if proc_params.COLUMNAR_RESULTS:
+        return results_to_segment(**results)
+
+    return results_to_changemodel(**results)
+
+
 def fit_procedure(dates, quality, prev_results, proc_params):
     """Determine which curve fitting method to use
 
@@ -136,9 +160,10 @@ def permanent_snow_procedure(dates, observations, fitter_fn, quality, prev_resul
         dates: list of ordinal day numbers relative to some epoch,
             the particular epoch does not matter.
         observations: values for one or more spectra corresponding
-            to each time.
-        fitter_fn: a function used to fit observation values and
-            acquisition dates for each spectra.
+            to each time. The index bands are derived if only the
+            reflectance and thermal bands are given.
+        fitter_fn: ccd.models.fitters.Fitter used to fit observation values
+            and acquisition dates for all of the spectra at once.
         quality: QA information for each observation
         prev_results:  Previous set of results to be updated with
             new observations
@@ -156,8 +181,15 @@ def permanent_snow_procedure(dates, observations, fitter_fn, quality, prev_resul
     fit_max_iter = proc_params.LASSO_MAX_ITER
     num_coef = proc_params.COEFFICIENT_MIN
 
-    processing_mask = qa.snow_procedure_filter(observations, quality,
-                                               dates, proc_params)
+    collector = metrics.collector(proc_params.METRICS)
+
+    with collector.timer('filter'):
+        processing_mask = qa.snow_procedure_filter(observations, quality,
+                                                   dates, proc_params)
+
+    with collector.timer('indices'):
+        observations = indices.append_indices(observations, processing_mask,
+                                              proc_params)
 
     period = dates[processing_mask]
     spectral_obs = observations[:, processing_mask]
@@ -165,19 +197,19 @@ def permanent_snow_procedure(dates, observations, fitter_fn, quality, prev_resul
     if np.sum(processing_mask) < meow_size:
         return [], processing_mask
 
-    models = [fitter_fn(period, spectrum, fit_max_iter, avg_days_yr, num_coef)
-              for spectrum in spectral_obs]
+    models = fitter_fn(period, spectral_obs, fit_max_iter, avg_days_yr, num_coef)
+    collector.count('fits')
 
     magnitudes = np.zeros(shape=(observations.shape[0],))
 
-    result = results_to_changemodel(fitted_models=models,
-                                    start_day=dates[0],
-                                    end_day=dates[-1],
-                                    break_day=dates[-1],
-                                    magnitudes=magnitudes,
-                                    observation_count=np.sum(processing_mask),
-                                    change_probability=0,
-                                    curve_qa=curve_qa)
+    result = changemodel(proc_params, fitted_models=models,
+                         start_day=dates[0],
+                         end_day=dates[-1],
+                         break_day=dates[-1],
+                         magnitudes=magnitudes,
+                         observation_count=np.sum(processing_mask),
+                         change_probability=0,
+                         curve_qa=curve_qa)
 
     return (result,), processing_mask
 
@@ -195,9 +227,10 @@ def insufficient_clear_procedure(dates, observations, fitter_fn, quality, prev_r
         dates: list of ordinal day numbers relative to some epoch,
             the particular epoch does not matter.
         observations: values for one or more spectra corresponding
-            to each time.
-        fitter_fn: a function used to fit observation values and
-            acquisition dates for each spectra.
+            to each time. The index bands are derived if only the
+            reflectance and thermal bands are given.
+        fitter_fn: ccd.models.fitters.Fitter used to fit observation values
+            and acquisition dates for all of the spectra at once.
         quality: QA information for each observation
         prev_results:  Previous set of results to be updated with
             new observations
@@ -215,8 +248,15 @@ def insufficient_clear_procedure(dates, observations, fitter_fn, quality, prev_r
     fit_max_iter = proc_params.LASSO_MAX_ITER
     num_coef = proc_params.COEFFICIENT_MIN
 
-    processing_mask = qa.insufficient_clear_filter(observations, quality,
-                                                   dates, proc_params)
+    collector = metrics.collector(proc_params.METRICS)
+
+    with collector.timer('filter'):
+        processing_mask = qa.insufficient_clear_filter(observations, quality,
+                                                       dates, proc_params)
+
+    with collector.timer('indices'):
+        observations = indices.append_indices(observations, processing_mask,
+                                              proc_params)
 
     period = dates[processing_mask]
     spectral_obs = observations[:, processing_mask]
@@ -224,19 +264,19 @@ def insufficient_clear_procedure(dates, observations, fitter_fn, quality, prev_r
     if np.sum(processing_mask) < meow_size:
         return [], processing_mask
 
-    models = [fitter_fn(period, spectrum, fit_max_iter, avg_days_yr, num_coef)
-              for spectrum in spectral_obs]
+    models = fitter_fn(period, spectral_obs, fit_max_iter, avg_days_yr, num_coef)
+    collector.count('fits')
 
     magnitudes = np.zeros(shape=(observations.shape[0],))
 
-    result = results_to_changemodel(fitted_models=models,
-                                    start_day=dates[0],
-                                    end_day=dates[-1],
-                                    break_day=dates[-1],
-                                    magnitudes=magnitudes,
-                                    observation_count=np.sum(processing_mask),
-                                    change_probability=0,
-                                    curve_qa=curve_qa)
+    result = changemodel(proc_params, fitted_models=models,
+                         start_day=dates[0],
+                         end_day=dates[-1],
+                         break_day=dates[-1],
+                         magnitudes=magnitudes,
+                         observation_count=np.sum(processing_mask),
+                         change_probability=0,
+                         curve_qa=curve_qa)
 
     return (result,), processing_mask
 
@@ -266,9 +306,10 @@ def standard_procedure(dates, observations, fitter_fn, quality, prev_results,
         dates: list of ordinal day numbers relative to some epoch,
             the particular epoch does not matter.
         observations: 2-d array of observed spectral values corresponding
-            to each time.
-        fitter_fn: a function used to fit observation values and
-            acquisition dates for each spectra.
+            to each time. The index bands are derived if only the reflectance
+            and thermal bands are given.
+        fitter_fn: ccd.models.fitters.Fitter used to fit observation values
+            and acquisition dates for all of the spectra at once.
         quality: QA information for each observation
         prev_results:  Previous set of results to be updated with
             new observations
@@ -289,10 +330,16 @@ def standard_procedure(dates, observations, fitter_fn, quality, prev_results,
               'initial meow_size: %s, initial peek_size: %s',
               dates.shape[0], observations.shape, meow_size, defpeek)
 
+    collector = metrics.collector(proc_params.METRICS)
+
     # First we need to filter the observations based on the spectra values
     # and qa information and convert kelvin to celsius.
     # We then persist the processing mask through subsequent operations as
     # additional data points get identified to be excluded from processing.
+    # This all happens on a single working copy, the observations handed in
+    # may be a view into a larger block and are left untouched.
+    observations, derive_indices = indices.working_copy(observations,
+                                                        proc_params)
     observations[thermal_idx] = kelvin_to_celsius(observations[thermal_idx])
 
     # There's two ways to handle the boolean mask with the windows in
@@ -307,13 +354,15 @@ def standard_procedure(dates, observations, fitter_fn, quality, prev_results,
     # The masked module from numpy does not seem to really add anything of
     # benefit to what we need to do, plus scikit may still be incompatible
     # with them.
-    processing_mask = qa.standard_procedure_filter(observations, quality,
-                                                   dates, proc_params)
+    with collector.timer('filter'):
+        processing_mask = qa.standard_procedure_filter(observations, quality,
+                                                       dates, proc_params)
 
-    log.debug('Processing mask initial count: %s', np.sum(processing_mask))
+        log.debug('Processing mask initial count: %s',
+                  np.sum(processing_mask))
 
-    # TODO Temporary setup on this to just get it going
-    stat_mask = statmask(dates, processing_mask, proc_params.STAT_ORD)
+        # TODO Temporary setup on this to just get it going
+        stat_mask = statmask(dates, processing_mask, proc_params.STAT_ORD)
     log.debug('Stat mask count: %s', np.sum(stat_mask))
 
     # Start with a previous set results or start fresh. These edits unfortunately
@@ -338,6 +387,12 @@ def standard_procedure(dates, observations, fitter_fn, quality, prev_results,
         previous_end = 0
         start = True
 
+    # Any index bands that were not handed in are only derived for the
+    # observations that can still be used from here on out.
+    if derive_indices:
+        with collector.timer('indices'):
+            indices.fill_indices(observations, processing_mask, proc_params)
+
     obs_count = np.sum(processing_mask)
 
     if obs_count <= meow_size:
@@ -353,8 +408,9 @@ def standard_procedure(dates, observations, fitter_fn, quality, prev_results,
 
     # Calculate the variogram/madogram that will be used in subsequent
     # processing steps. See algorithm documentation for further information.
-    variogram = adjusted_variogram(dates[stat_mask],
-                                   observations[:, stat_mask])
+    with collector.timer('variogram'):
+        variogram = adjusted_variogram(dates[stat_mask],
+                                       observations[:, stat_mask])
 
     if not check_variogram(variogram):
         log.debug('Variogram failed check')
@@ -362,8 +418,16 @@ def standard_procedure(dates, observations, fitter_fn, quality, prev_results,
 
     log.debug('Variogram values: %s', variogram)
 
+    # From here on out the observations are only ever masked further, so they
+    # are compacted once and kept up to date as outliers are found.
+    # The design matrix rows for the acquisition dates are built once, and
+    # shared by every pixel that has the same dates, such as within a block.
+    masked = MaskedObservations(dates, observations, processing_mask,
+                                lasso.design_cache.matrix(
+                                    dates, proc_params.AVG_DAYS_YR))
+
     # Only build models as long as sufficient data exists.
-    while model_window.stop <= dates[processing_mask].shape[0] - meow_size:
+    while model_window.stop <= masked.count - meow_size:
         # Step 1: Initialize
         log.debug('Initialize for change model #: %s', len(results) + 1)
         if len(results) > 0:
@@ -371,10 +435,11 @@ def standard_procedure(dates, observations, fitter_fn, quality, prev_results,
 
         # Make things a little more readable by breaking this apart
         # catch return -> break apart into components
-        initialized = initialize(dates, observations, fitter_fn, model_window,
-                                 processing_mask, variogram, proc_params)
+        with collector.timer('initialize'):
+            initialized = initialize(masked, fitter_fn, model_window,
+                                     variogram, proc_params)
 
-        model_window, init_models, processing_mask = initialized
+        model_window, init_models = initialized
 
         # Catch for failure
         if init_models is None:
@@ -383,34 +448,33 @@ def standard_procedure(dates, observations, fitter_fn, quality, prev_results,
 
         # Step 2: Lookback
         if model_window.start > previous_end:
-            lb = lookback(dates, observations, model_window, init_models,
-                          previous_end, processing_mask, variogram, proc_params)
-
-            model_window, processing_mask = lb
+            with collector.timer('lookback'):
+                model_window = lookback(masked, model_window, init_models,
+                                        previous_end, variogram, proc_params)
 
         # Step 3: catch
         # If we have moved > peek_size from the previous break point
         # then we fit a generalized model to those points.
         if model_window.start - previous_end > peek_size and start is True:
-            results.append(catch(dates,
-                                 observations,
-                                 fitter_fn,
-                                 processing_mask,
-                                 slice(previous_end, model_window.start),
-                                 curve_qa['START'], proc_params))
+            with collector.timer('catch'):
+                results.append(catch(masked,
+                                     fitter_fn,
+                                     slice(previous_end, model_window.start),
+                                     curve_qa['START'], proc_params))
             start = False
 
         # Handle specific case where if we are at the end of a time series and
         # the peek size is greater than what remains of the data.
-        if model_window.stop + peek_size > dates[processing_mask].shape[0]:
+        if model_window.stop + peek_size > masked.count:
             break
 
         # Step 4: lookforward
         log.debug('Extend change model')
-        lf = lookforward(dates, observations, model_window, fitter_fn,
-                         processing_mask, variogram, proc_params)
+        with collector.timer('lookforward'):
+            lf = lookforward(masked, model_window, fitter_fn, variogram,
+                             proc_params)
 
-        result, processing_mask, model_window = lf
+        result, model_window = lf
         results.append(result)
 
         log.debug('Accumulate results, {} so far'.format(len(results)))
@@ -423,37 +487,36 @@ def standard_procedure(dates, observations, fitter_fn, quality, prev_results,
     # We can use previous start here as that value should be equal to
     # model_window.stop due to the constraints on the the previous while
     # loop.
-    if previous_end + peek_size < dates[processing_mask].shape[0]:
-        model_window = slice(previous_end, dates[processing_mask].shape[0])
-        results.append(catch(dates, observations, fitter_fn,
-                             processing_mask, model_window,
-                             curve_qa['END'], proc_params))
+    if previous_end + peek_size < masked.count:
+        model_window = slice(previous_end, masked.count)
+        with collector.timer('catch'):
+            results.append(catch(masked, fitter_fn, model_window,
+                                 curve_qa['END'], proc_params))
 
     log.debug("change detection complete")
 
-    return results, processing_mask
+    return results, masked.mask
 
 
-def initialize(dates, observations, fitter_fn, model_window, processing_mask,
-               variogram, proc_params):
+def initialize(masked, fitter_fn, model_window, variogram, proc_params):
     """
     Determine a good starting point at which to build off of for the
     subsequent process of change detection, both forward and backward.
 
     Args:
-        dates: 1-d ndarray of ordinal day values
-        observations: 2-d ndarray representing the spectral values
-        fitter_fn: function used for the regression portion of the algorithm
+        masked: MaskedObservations being processed, any Tmask outliers are
+            masked out of it
+        fitter_fn: ccd.models.fitters.Fitter used for the regression portion
+            of the algorithm
         model_window: start index of time/observation window
-        processing_mask: 1-d boolean array identifying which values to
-            consider for processing
         variogram: 1-d array of variogram values to compare against for the
             normalization factor
         proc_params: dictionary of processing parameters
 
     Returns:
         slice: model window that was deemed to be a stable start
-        namedtuple: fitted regression models
+        BandModels: fitted regression models, only for the detection bands
+            when FIT_DETECTION_ONLY is set
     """
 
     meow_size = proc_params.MEOW_SIZE
@@ -464,9 +527,14 @@ def initialize(dates, observations, fitter_fn, model_window, processing_mask,
     tmask_scale = proc_params.T_CONST
     avg_days_yr = proc_params.AVG_DAYS_YR
     fit_max_iter = proc_params.LASSO_MAX_ITER
+    collector = metrics.collector(proc_params.METRICS)
 
-    period = dates[processing_mask]
-    spectral_obs = observations[:, processing_mask]
+    period = masked.period
+    spectral_obs = masked.spectra
+
+    fit_bands, detection_idx = search_bands(spectral_obs.shape[0],
+                                            detection_bands,
+                                            proc_params.FIT_DETECTION_ONLY)
 
     log.debug('Initial model window %s', model_window)
     models = None
@@ -489,6 +557,7 @@ def initialize(dates, observations, fitter_fn, model_window, processing_mask,
                                      spectral_obs[:, model_window],
                                      variogram, tmask_bands, tmask_scale,
                                      avg_days_yr)
+        collector.count('tmask_fits')
 
         tmask_count = np.sum(tmask_outliers)
 
@@ -519,27 +588,27 @@ def initialize(dates, observations, fitter_fn, model_window, processing_mask,
 
         # Update the persistent mask with the values identified by the Tmask
         if any(tmask_outliers):
-            processing_mask = update_processing_mask(processing_mask,
-                                                     tmask_outliers,
-                                                     model_window)
+            masked.remove(tmask_outliers, model_window)
+            collector.count('outliers', tmask_count)
 
             # The model window now actually refers to a smaller slice
             model_window = slice(model_window.start,
                                  model_window.stop - tmask_count)
             # Update the subset
-            period = dates[processing_mask]
-            spectral_obs = observations[:, processing_mask]
+            period = masked.period
+            spectral_obs = masked.spectra
 
         log.debug('Generating models to check for stability')
-        models = [fitter_fn(period[model_window], spectrum,
-                            fit_max_iter, avg_days_yr, 4)
-                  for spectrum in spectral_obs[:, model_window]]
+        models = fitter_fn(period[model_window],
+                           spectral_obs[fit_bands, model_window],
+                           fit_max_iter, avg_days_yr, 4)
+        collector.count('fits')
 
         # If a model is not stable, then it is possible that a disturbance
         # exists somewhere in the observation window. The window shifts
         # forward in time, and begins initialization again.
-        if not stable(models, period[model_window], variogram,
-                      change_thresh, detection_bands):
+        if not stable(models, period[model_window], variogram[fit_bands],
+                      change_thresh, detection_idx):
 
             model_window = slice(model_window.start + 1, model_window.stop + 1)
             log.debug('Unstable model, shift window to: %s', model_window)
@@ -551,30 +620,25 @@ def initialize(dates, observations, fitter_fn, model_window, processing_mask,
             break
 
     log.debug(f'Final model window {model_window}')
-    return model_window, models, processing_mask
+    return model_window, models
 
 
-def lookforward(dates, observations, model_window, fitter_fn, processing_mask,
-                variogram, proc_params):
+def lookforward(masked, model_window, fitter_fn, variogram, proc_params):
     """Increase observation window until change is detected or
     we are out of observations.
 
     Args:
-        dates: list of ordinal day numbers relative to some epoch,
-            the particular epoch does not matter.
-        observations: spectral values, list of spectra -> values
+        masked: MaskedObservations being processed, any outliers are masked
+            out of it
         model_window: span of indices that is represented in the current
             process
-        fitter_fn: function used to model observations
-        processing_mask: 1-d boolean array identifying which values to
-            consider for processing
+        fitter_fn: ccd.models.fitters.Fitter used to model observations
         variogram: 1-d array of variogram values to compare against for the
             normalization factor
         proc_params: dictionary of processing parameters
 
     Returns:
         namedtuple: representation of the time segment
-        1-d bool ndarray: processing mask that may have been modified
         slice: model window
     """
 
@@ -588,6 +652,7 @@ def lookforward(dates, observations, model_window, fitter_fn, processing_mask,
     outlier_thresh = proc_params.OUTLIER_THRESHOLD
     avg_days_yr = proc_params.AVG_DAYS_YR
     fit_max_iter = proc_params.LASSO_MAX_ITER
+    collector = metrics.collector(proc_params.METRICS)
 
     # Step 4: lookforward.
     # The second step is to update a model until observations that do not
@@ -607,14 +672,37 @@ def lookforward(dates, observations, model_window, fitter_fn, processing_mask,
     change = 0
 
     # Initial subset of the data
-    period = dates[processing_mask]
-    spectral_obs = observations[:, processing_mask]
+    period = masked.period
+    spectral_obs = masked.spectra
+
+    band_count = spectral_obs.shape[0]
+    fit_bands, detection_idx = search_bands(band_count, detection_bands,
+                                            proc_params.FIT_DETECTION_ONLY)
 
     # Used for comparison purposes
     fit_span = span(period, fit_window)
 
+    # The start of the window does not move while looking forward, so the
+    # native lasso can carry running sums across refits, only adding the
+    # observations that have come into the window since the last one.
+    warm_start = fitter_fn.warm_start and proc_params.FIT_WARM_START
+
+    incremental = None
+    if proc_params.FIT_INCREMENTAL and fitter_fn.incremental:
+        incremental = lasso.IncrementalLasso(fit_bands.shape[0],
+                                             period.shape[0],
+                                             fit_max_iter,
+                                             avg_days_yr,
+                                             period[model_window.start],
+                                             warm_start)
+
     # stop is always exclusive
-    while model_window.stop + peek_size <= period.shape[0]:
+    while model_window.stop + peek_size <= masked.count:
+        # Masking out an outlier is only compacted into the buffers when
+        # they are next read
+        period = masked.period
+        spectral_obs = masked.spectra
+
         num_coefs = determine_num_coefs(period[model_window], coef_min,
                                         coef_mid, coef_max, num_obs_fact)
 
@@ -629,22 +717,47 @@ def lookforward(dates, observations, model_window, fitter_fn, processing_mask,
         # or it the first iteration, then we always fit a new window
         # If the number of observations that the current fitted models
         # expand past a threshold, then we need to fit new ones.
-        if not models or model_window.stop - model_window.start < 24 or model_span >= 1.33 * fit_span:
+        if models is None or model_window.stop - model_window.start < 24 or model_span >= 1.33 * fit_span:
+            if models is not None and model_window.stop - model_window.start >= 24:
+                collector.count('span_refits')
+
             fit_window = model_window
             fit_span = span(period, fit_window)
 
-            log.debug('Retrain models')
-            models = [fitter_fn(period[fit_window], spectrum,
-                                fit_max_iter, avg_days_yr, num_coefs)
-                      for spectrum in spectral_obs[:, fit_window]]
+            fit_coefs = num_coefs
 
-        residuals = np.array([calc_residuals(period[peek_window],
-                                             spectral_obs[idx, peek_window],
-                                             models[idx], avg_days_yr)
-                              for idx in range(observations.shape[0])])
+            log.debug('Retrain models')
+            if incremental is not None:
+                added = slice(fit_window.start + incremental.count,
+                              fit_window.stop)
+                incremental.extend(period[added],
+                                   spectral_obs[fit_bands, added],
+                                   masked.design_rows(added))
+                models = incremental.fitted_models(num_coefs)
+            elif warm_start and models is not None:
+                models = fitter_fn(period[fit_window],
+                                   spectral_obs[fit_bands, fit_window],
+                                   fit_max_iter, avg_days_yr, num_coefs,
+                                   warm_start=models.coefficients)
+            else:
+                models = fitter_fn(period[fit_window],
+                                   spectral_obs[fit_bands, fit_window],
+                                   fit_max_iter, avg_days_yr, num_coefs)
+
+            collector.count('fits')
+            if models.n_iter is not None:
+                collector.count('fit_iterations', np.sum(models.n_iter))
+            log.debug('Fit iterations: %s', models.n_iter)
+
+        peek_period = period[peek_window]
+        peek_obs = spectral_obs[:, peek_window]
+
+        residuals = calc_residuals(peek_period, peek_obs[fit_bands],
+                                   models, avg_days_yr,
+                                   masked.design_rows(peek_window))
 
         if model_window.stop - model_window.start <= 24:
-            comp_rmse = [models[idx].rmse for idx in detection_bands]
+            comp_rmse = models.rmse[detection_idx]
 
         # More than 24 points
         else:
@@ -655,12 +768,13 @@ def lookforward(dates, observations, model_window, fitter_fn, processing_mask,
 
             # Calculate an RMSE for the seasonal residual values, using 8
             # as the degrees of freedom.
-            comp_rmse = [euclidean_norm(models[idx].residual[closest_indexes]) / 4
-                         for idx in detection_bands]
+            comp_rmse = euclidean_norm(
+                models.residuals[detection_idx][:, closest_indexes],
+                axis=1) / 4
 
         # Calculate the change magnitude values for each observation in the
         # peek_window.
-        magnitude = change_magnitude(residuals[detection_bands, :],
+        magnitude = change_magnitude(residuals[detection_idx, :],
                                      variogram[detection_bands],
                                      comp_rmse)
 
@@ -675,60 +789,77 @@ def lookforward(dates, observations, model_window, fitter_fn, processing_mask,
 
             # Keep track of any outliers so they will be excluded from future
             # processing steps
-            processing_mask = update_processing_mask(processing_mask,
-                                                     peek_window.start)
+            masked.remove(peek_window.start)
+            collector.count('outliers')
 
             # Because only one value was excluded, we shouldn't need to adjust
             # the model_window.  The location hasn't been used in
             # processing yet. So, the next iteration can use the same windows
             # without issue.
-            period = dates[processing_mask]
-            spectral_obs = observations[:, processing_mask]
             continue
 
         # Check before incrementing the model window, otherwise the reporting
         # can get a little messy.
-        if model_window.stop + peek_size > period.shape[0]:
+        if model_window.stop + peek_size > masked.count:
             break
 
         model_window = slice(model_window.start, model_window.stop + 1)
 
-    result = results_to_changemodel(fitted_models=models,
-                                    start_day=period[model_window.start],
-                                    end_day=period[model_window.stop - 1],
-                                    break_day=period[peek_window.start],
-                                    magnitudes=np.median(residuals, axis=1),
-                                    observation_count=(
-                                    model_window.stop - model_window.start),
-                                    change_probability=change,
-                                    curve_qa=num_coefs)
-
-    return result, processing_mask, model_window
-
-
-def lookback(dates, observations, model_window, models, previous_break,
-             processing_mask, variogram, proc_params):
+    # An outlier masked out on the last pass has yet to be compacted away.
+    # Hold on to what the residuals were calculated against before the
+    # buffers shift under the peek window.
+    if masked.pending:
+        peek_period = peek_period.copy()
+        peek_obs = peek_obs.copy()
+        period = masked.period
+        spectral_obs = masked.spectra
+
+    # The segment is final, so fit the rest of the bands over the same window
+    # the detection bands were last fit with. Warm started fits only converge
+    # to within the tolerance of a cold one, so they are refit cold as well,
+    # giving the same models whether or not only the detection bands were fit.
+    if fit_bands.shape[0] < band_count or warm_start:
+        models = fitter_fn(period[fit_window], spectral_obs[:, fit_window],
+                           fit_max_iter, avg_days_yr, fit_coefs)
+        collector.count('fits')
+        if models.n_iter is not None:
+            collector.count('fit_iterations', np.sum(models.n_iter))
+        residuals = calc_residuals(peek_period, peek_obs, models, avg_days_yr)
+
+    result = changemodel(proc_params, fitted_models=models,
+                         start_day=period[model_window.start],
+                         end_day=period[model_window.stop - 1],
+                         break_day=period[peek_window.start],
+                         magnitudes=np.median(residuals, axis=1),
+                         observation_count=(
+                         model_window.stop - model_window.start),
+                         change_probability=change,
+                         curve_qa=num_coefs)
+
+    return result, model_window
+
+
+def lookback(masked, model_window, models, previous_break, variogram,
+             proc_params):
     """
     Special case when there is a gap between the start of a time series model
     and the previous model break point, this can include values that were
     excluded during the initialization step.
 
     Args:
-        dates: list of ordinal days
-        observations: spectral values across bands
+        masked: MaskedObservations being processed, any outliers are masked
+            out of it
         model_window: current window of values that is being considered
-        models: currently fitted models for the model_window
+        models: currently fitted models for the model_window, as they come
+            from initialize
         previous_break: index value of the previous break point, or the start
             of the time series if there wasn't one
-        processing_mask: index values that are currently being masked out from
-            processing
         variogram: 1-d array of variogram values to compare against for the
             normalization factor
         proc_params: dictionary of processing parameters
 
     Returns:
         slice: window of indices to be used
-        array: indices of data that have been flagged as outliers
     """
 
     peek_size = proc_params.PEEK_SIZE
@@ -736,10 +867,15 @@ def lookback(dates, observations, model_window, models, previous_break,
     change_thresh = proc_params.CHANGE_THRESHOLD
     outlier_thresh = proc_params.OUTLIER_THRESHOLD
     avg_days_yr = proc_params.AVG_DAYS_YR
+    collector = metrics.collector(proc_params.METRICS)
 
     log.debug('Previous break: %s model window: %s', previous_break, model_window)
-    period = dates[processing_mask]
-    spectral_obs = observations[:, processing_mask]
+    period = masked.period
+    spectral_obs = masked.spectra
+
+    fit_bands, detection_idx = search_bands(spectral_obs.shape[0],
+                                            detection_bands,
+                                            proc_params.FIT_DETECTION_ONLY)
 
     while model_window.start > previous_break:
         # Three conditions to see how far we want to look back each iteration.
@@ -759,16 +895,16 @@ def lookback(dates, observations, model_window, models, previous_break,
         log.debug('Considering index: %s using peek window: %s',
                   peek_window.start, peek_window)
 
-        residuals = np.array([calc_residuals(period[peek_window],
-                                             spectral_obs[idx, peek_window],
-                                             models[idx], avg_days_yr)
-                              for idx in range(observations.shape[0])])
+        residuals = calc_residuals(period[peek_window],
+                                   spectral_obs[fit_bands, peek_window],
+                                   models, avg_days_yr,
+                                   masked.design_rows(peek_window))
 
-        comp_rmse = [models[idx].rmse for idx in detection_bands]
+        comp_rmse = models.rmse[detection_idx]
 
         log.debug('RMSE values for comparison: %s', comp_rmse)
 
-        magnitude = change_magnitude(residuals[detection_bands, :],
+        magnitude = change_magnitude(residuals[detection_idx, :],
                                      variogram[detection_bands],
                                      comp_rmse)
 
@@ -778,11 +914,11 @@ def lookback(dates, observations, model_window, models, previous_break,
             break
         elif detect_outlier(magnitude[0], outlier_thresh):
             log.debug('Outlier detected for index: %s', peek_window.start)
-            processing_mask = update_processing_mask(processing_mask,
-                                                     peek_window.start)
+            masked.remove(peek_window.start)
+            collector.count('outliers')
 
-            period = dates[processing_mask]
-            spectral_obs = observations[:, processing_mask]
+            period = masked.period
+            spectral_obs = masked.spectra
 
             # Because this location was used in determining the model_window
             # passed in, we must now account for removing it.
@@ -792,24 +928,21 @@ def lookback(dates, observations, model_window, models, previous_break,
         log.debug('Including index: %s', peek_window.start)
         model_window = slice(peek_window.start, model_window.stop)
 
-    return model_window, processing_mask
+    return model_window
 
 
-def catch(dates, observations, fitter_fn, processing_mask, model_window,
-          curve_qa, proc_params):
+def catch(masked, fitter_fn, model_window, curve_qa, proc_params):
     """
     Handle special cases where general models just need to be fitted and return
     their results.
 
     Args:
-        dates: list of ordinal day numbers relative to some epoch,
-            the particular epoch does not matter.
-        observations: spectral values, list of spectra -> values
+        masked: MaskedObservations being processed
+        fitter_fn: ccd.models.fitters.Fitter used to model observations
         model_window: span of indices that is represented in the current
             process
-        fitter_fn: function used to model observations
-        processing_mask: 1-d boolean array identifying which values to
-            consider for processing
+        curve_qa: curve qa value to report for the segment
+        proc_params: dictionary of processing parameters
 
     Returns:
         namedtuple representing the time segment
@@ -821,30 +954,30 @@ def catch(dates, observations, fitter_fn, processing_mask, model_window,
     num_coef = proc_params.COEFFICIENT_MIN
 
     log.debug('Catching observations: %s', model_window)
-    period = dates[processing_mask]
-    spectral_obs = observations[:, processing_mask]
+    period = masked.period
+    spectral_obs = masked.spectra
 
     # Subset the data based on the model window
     model_period = period[model_window]
     model_spectral = spectral_obs[:, model_window]
 
-    models = [fitter_fn(model_period, spectrum, fit_max_iter, avg_days_yr,
-                        num_coef)
-              for spectrum in model_spectral]
+    models = fitter_fn(model_period, model_spectral, fit_max_iter, avg_days_yr,
+                       num_coef)
+    metrics.collector(proc_params.METRICS).count('fits')
 
     if model_window.stop >= period.shape[0]:
         break_day = period[-1]
     else:
         break_day = period[model_window.stop]
 
-    result = results_to_changemodel(fitted_models=models,
-                                    start_day=period[model_window.start],
-                                    end_day=period[model_window.stop - 1],
-                                    break_day=break_day,
-                                    magnitudes=np.zeros(shape=(14,)),
-                                    observation_count=(
-                                        model_window.stop - model_window.start),
-                                    change_probability=0,
-                                    curve_qa=curve_qa)
+    result = changemodel(proc_params, fitted_models=models,
+                         start_day=period[model_window.start],
+                         end_day=period[model_window.stop - 1],
+                         break_day=break_day,
+                         magnitudes=np.zeros(shape=(14,)),
+                         observation_count=(
+                             model_window.stop - model_window.start),
+                         change_probability=0,
+                         curve_qa=curve_qa)
 
     return result
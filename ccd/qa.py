@@ -58,19 +58,132 @@ def qabitval(packedint, proc_params):
         raise ValueError('Unsupported bitpacked QA value {}'.format(packedint))
 
 
+def __unpack(quality, proc_params):
+    """
+    Apply the QA hierarchy with bit operations across a whole array. Lower
+    priority flags are written first and then overwritten by the higher
+    priority ones. Unsupported values are left as -1.
+    """
+    unpacked = np.full(quality.shape, -1, dtype=np.int64)
+
+    # L8 Cirrus and Terrain Occlusion
+    occlusion = checkbit(quality, proc_params.QA_OCCLUSION)
+    cirrus = checkbit(quality, proc_params.QA_CIRRUS1)
+    cirrus &= checkbit(quality, proc_params.QA_CIRRUS2)
+    unpacked[occlusion] = proc_params.QA_CLEAR
+    unpacked[cirrus] = proc_params.QA_CLEAR
+
+    for flag in (proc_params.QA_CLEAR, proc_params.QA_WATER,
+                 proc_params.QA_SNOW, proc_params.QA_SHADOW,
+                 proc_params.QA_CLOUD, proc_params.QA_FILL):
+        unpacked[checkbit(quality, flag)] = flag
+
+    return unpacked
+
+
+def __check_unpacked(quality, unpacked):
+    """
+    Raise on any values that could not be unpacked, listing all of them.
+    """
+    unsupported = unpacked == -1
+    if np.any(unsupported):
+        raise ValueError('Unsupported bitpacked QA values {}'
+                         .format(np.unique(quality[unsupported]).tolist()))
+
+
 def unpackqa(quality, proc_params):
     """
     Transform the bit-packed QA values into their bit offset.
-    
+
+    Applies the same hierarchy as qabitval, but with bit operations across
+    the whole array at once.
+
+    fill > cloud > shadow > snow > water > clear
+
+    Args:
+        quality: n-d array or list of bit-packed QA values, such as a 1-d
+            time series or a 2-d (time, pixels) block
+        proc_params: dictionary of processing parameters
+
+    Returns:
+        n-d ndarray, same shape as the input
+
+    Raises:
+        ValueError: listing every unsupported value found in the input
+    """
+    quality = np.asarray(quality, dtype=np.int64)
+
+    unpacked = __unpack(quality, proc_params)
+    __check_unpacked(quality, unpacked)
+
+    return unpacked
+
+
+# Lookup tables covering every 16-bit QA value, keyed on the QA offsets they
+# were built with
+__qa_tables = {}
+
+QA_TABLE_KEYS = ('QA_FILL', 'QA_CLEAR', 'QA_WATER', 'QA_SHADOW', 'QA_SNOW',
+                 'QA_CLOUD', 'QA_CIRRUS1', 'QA_CIRRUS2', 'QA_OCCLUSION')
+
+
+def qa_lookup_table(proc_params):
+    """
+    Unpacked values for every possible 16-bit QA value, built once for each
+    set of QA offsets and then reused.
+
+    Args:
+        proc_params: dictionary of processing parameters
+
+    Returns:
+        1-d int8 ndarray of 65536 values, -1 where the value is unsupported
+    """
+    key = tuple(proc_params[k] for k in QA_TABLE_KEYS)
+
+    if key not in __qa_tables:
+        table = __unpack(np.arange(2 ** 16, dtype=np.int64), proc_params)
+        table = table.astype(np.int8)
+        table.flags.writeable = False
+        __qa_tables[key] = table
+
+    return __qa_tables[key]
+
+
+def unpackqa_lut(quality, proc_params):
+    """
+    Transform the bit-packed QA values into their bit offset with a single
+    lookup into the precomputed table for the current QA offsets.
+
+    Gives the same values as unpackqa for 16-bit QA.
+
     Args:
-        quality: 1-d array or list of bit-packed QA values
+        quality: n-d integer array or list of bit-packed QA values
         proc_params: dictionary of processing parameters
 
     Returns:
-        1-d ndarray
+        n-d int8 ndarray, same shape as the input
+
+    Raises:
+        ValueError: if the values are not integers, or listing every
+            unsupported value found in the input, including any outside of
+            the 16-bit range
     """
+    quality = np.asarray(quality)
+
+    if quality.dtype != np.uint16:
+        if not np.issubdtype(quality.dtype, np.integer):
+            raise ValueError('Bitpacked QA values must be integers, got {}'
+                             .format(quality.dtype))
+
+        outside = (quality < 0) | (quality >= 2 ** 16)
+        if np.any(outside):
+            raise ValueError('Unsupported bitpacked QA values {}'
+                             .format(np.unique(quality[outside]).tolist()))
+
+    unpacked = qa_lookup_table(proc_params)[quality]
+    __check_unpacked(quality, unpacked)
 
-    return np.array([qabitval(q, proc_params) for q in quality])
+    return unpacked
 
 
 def count_clear_or_water(quality, clear, water):
@@ -0,0 +1,266 @@
+"""
+Memory mapped reading of chip and tile cubes that are too large to load.
+
+The spectra are stored band sequential, shaped (bands, time, pixels) with the
+pixels varying fastest, and the QA shaped (time, pixels), the same layout that
+ccd.detect_block and ccd.parallel.detect_tile take. Nothing is read when a
+cube is opened. A block of contiguous pixels is a view into the mapped files,
+and only the pages holding those pixels, for each band and date, are read as
+the block is processed. Pixels are numbered row by row across the chip, so
+the pixel at (row, col) is row * cols + col.
+
+Two layouts can be opened:
+    open_npy: a directory of dates.npy, spectra.npy and qas.npy, as written
+        by benchmarks.synthetic.chip or np.lib.format.open_memmap
+    open_raw: headerless band sequential files of the spectra and the QA,
+        the dates being given separately
+
+Only one page for each band and date is needed for a small block, but the
+kernel reads ahead around every page touched, which for a tile pulls in the
+neighbouring pixels as well. So by default the mappings are marked as being
+read at random, turning the read ahead off where the platform supports
+madvise. When sweeping the whole cube the read ahead does no harm, and it can
+be left on with readahead=True.
+
+The pages read stay in the page cache and are counted towards the resident
+memory of the process, but they are backed by the files and released by the
+operating system as needed.
+"""
+import logging
+import mmap
+import os
+
+import numpy as np
+
+import ccd
+from ccd.parallel import chunk_slices
+
+log = logging.getLogger(__name__)
+
+
+class Cube(object):
+    """
+    Dates, spectra and QA of a chip, handing out views of blocks or pixels in
+    the form the detect functions take.
+
+    Attributes:
+        dates: 1-d ndarray of ordinal dates shared by every pixel
+        spectra: 3-d ndarray, (bands, time, pixels), in memory or backed by
+            a memory mapped file
+        qas: 2-d ndarray, (time, pixels), the same
+    """
+    def __init__(self, dates, spectra, qas):
+        dates = np.asarray(dates)
+
+        if spectra.ndim != 3 or qas.ndim != 2:
+            raise ValueError('Spectra must be (bands, time, pixels) and the '
+                             'QA (time, pixels), got {} and {}'
+                             .format(spectra.shape, qas.shape))
+
+        if spectra.shape[1:] != qas.shape or dates.shape != qas.shape[:1]:
+            raise ValueError('Dates {}, spectra {} and QA {} do not line up'
+                             .format(dates.shape, spectra.shape, qas.shape))
+
+        self.dates = dates
+        self.spectra = spectra
+        self.qas = qas
+
+    @property
+    def pixel_count(self):
+        return self.qas.shape[1]
+
+    def __len__(self):
+        return self.pixel_count
+
+    def block(self, pixels):
+        """
+        Views of a contiguous block of pixels, without reading them.
+
+        Args:
+            pixels: slice along the pixel axis
+
+        Returns:
+            3-d ndarray: spectra (bands, time, pixels)
+            2-d ndarray: QA (time, pixels)
+        """
+        return self.spectra[:, :, pixels], self.qas[:, pixels]
+
+    def pixel(self, index):
+        """
+        Views of a single pixel, without reading it.
+
+        Args:
+            index: pixel index
+
+        Returns:
+            2-d ndarray: spectra (bands, time), as ccd.detect_array takes
+            1-d ndarray: QA
+        """
+        return self.spectra[:, :, index], self.qas[:, index]
+
+    def blocks(self, chunk_size, start=0, stop=None):
+        """
+        Walk the pixels in contiguous blocks.
+
+        Args:
+            chunk_size: number of pixels in each block, the last block may be
+                smaller
+            start: first pixel
+            stop: pixel to stop before, defaults to the end of the cube
+
+        Yields:
+            slice: the pixels in the block
+            3-d ndarray: spectra (bands, time, pixels)
+            2-d ndarray: QA (time, pixels)
+        """
+        stop = self.pixel_count if stop is None else min(stop,
+                                                         self.pixel_count)
+
+        for chunk in chunk_slices(stop - start, chunk_size):
+            chunk = slice(chunk.start + start, chunk.stop + start)
+            yield (chunk,) + self.block(chunk)
+
+    def pixels(self, chunk_size=100, start=0, stop=None):
+        """
+        Walk the pixels one at a time, a block at a time, so that the pages
+        shared by neighbouring pixels are read together.
+
+        Args:
+            chunk_size: number of pixels in each block
+            start: first pixel
+            stop: pixel to stop before, defaults to the end of the cube
+
+        Yields:
+            int: pixel index
+            2-d ndarray: spectra (bands, time)
+            1-d ndarray: QA
+        """
+        for chunk, spectra, qas in self.blocks(chunk_size, start, stop):
+            for offset in range(chunk.stop - chunk.start):
+                yield (chunk.start + offset, spectra[:, :, offset],
+                       qas[:, offset])
+
+    def detect(self, params=None, chunk_size=100, start=0, stop=None):
+        """
+        Run ccd.detect_block a block at a time, in this process. For a process
+        pool hand the spectra and QA to ccd.parallel.detect_tile, which slices
+        them the same way.
+
+        Args:
+            params: python dictionary to change module wide processing
+                parameters
+            chunk_size: number of pixels in each block
+            start: first pixel
+            stop: pixel to stop before, defaults to the end of the cube
+
+        Yields:
+            tuple: (pixel index, change detection results) in pixel order
+        """
+        for chunk, spectra, qas in self.blocks(chunk_size, start, stop):
+            results = ccd.detect_block(self.dates, spectra, qas, params=params)
+
+            for offset, result in enumerate(results):
+                yield chunk.start + offset, result
+
+
+def __map(path, dtype, shape, offset, readahead, order='C'):
+    """
+    Memory map an array held in a file, read only, marking the mapping as
+    being read at random unless the read ahead is wanted.
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    advice = getattr(mmap, 'MADV_RANDOM', None)
+
+    if not readahead:
+        if advice is None or not hasattr(mapped, 'madvise'):
+            log.debug('Unable to turn off the read ahead for %s, madvise is '
+                      'not supported on this platform', path)
+        else:
+            mapped.madvise(advice)
+
+    return np.ndarray(shape, dtype=dtype, buffer=mapped, offset=offset,
+                      order=order)
+
+
+def open_npy(path, spectra='spectra.npy', qas='qas.npy', dates='dates.npy',
+             readahead=False):
+    """
+    Memory map a chip saved as .npy files.
+
+    Args:
+        path: directory holding the files
+        spectra: file name of the (bands, time, pixels) spectra
+        qas: file name of the (time, pixels) QA
+        dates: file name of the ordinal dates, which are loaded
+        readahead: leave the kernel read ahead on
+
+    Returns:
+        Cube
+    """
+    return Cube(np.load(os.path.join(path, dates)),
+                __npy(os.path.join(path, spectra), readahead),
+                __npy(os.path.join(path, qas), readahead))
+
+
+def __npy(path, readahead):
+    """
+    Memory map the array in a .npy file, taking its layout from the header.
+    """
+    header = np.load(path, mmap_mode='r')
+    order = 'F' if header.flags.f_contiguous and header.ndim > 1 else 'C'
+
+    return __map(path, header.dtype, header.shape, header.offset, readahead,
+                 order)
+
+
+def __raw_shape(path, dtype, shape, offset):
+    """
+    Shape of the array in a headerless file, working out the number of pixels
+    from its size.
+    """
+    dtype = np.dtype(dtype)
+    step = int(np.prod(shape)) * dtype.itemsize
+    size = os.path.getsize(path) - offset
+
+    if size <= 0 or size % step:
+        raise ValueError('{} is {} bytes past the offset, not a whole number '
+                         'of {} {} values'.format(path, size, shape, dtype))
+
+    return tuple(shape) + (size // step,)
+
+
+def open_raw(spectra_path, qas_path, dates, bands=7, dtype=np.int16,
+             qa_dtype=np.uint16, offset=0, qa_offset=0, readahead=False):
+    """
+    Memory map headerless band sequential files, such as ENVI BSQ cubes.
+
+    The spectra file holds each band in turn, each band holding each date in
+    turn, each date holding every pixel. The QA file holds each date in turn.
+    Values are in native byte order unless the dtypes say otherwise, such as
+    '>i2'.
+
+    Args:
+        spectra_path: file of the spectra
+        qas_path: file of the QA
+        dates: 1-d array of ordinal dates, one for each date in the files
+        bands: number of bands in the spectra file, in the same order as the
+            ccd.detect arguments
+        dtype: data type of the spectra
+        qa_dtype: data type of the QA
+        offset: bytes to skip at the start of the spectra file
+        qa_offset: bytes to skip at the start of the QA file
+        readahead: leave the kernel read ahead on
+
+    Returns:
+        Cube
+    """
+    dates = np.asarray(dates)
+    spectra_shape = __raw_shape(spectra_path, dtype, (bands, dates.shape[0]),
+                                offset)
+    qas_shape = __raw_shape(qas_path, qa_dtype, (dates.shape[0],), qa_offset)
+
+    return Cube(dates,
+                __map(spectra_path, dtype, spectra_shape, offset, readahead),
+                __map(qas_path, qa_dtype, qas_shape, qa_offset, readahead))
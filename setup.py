@@ -75,7 +75,8 @@ setup(
         'docs': ['sphinx',
                  'sphinx-autobuild',
                  'sphinx_rtd_theme'],
-        'deploy': ['twine']
+        'deploy': ['twine'],
+        'accel': ['numba>=0.50']
     },
 
     setup_requires=['pytest-runner', 'pip'],
@@ -6,6 +6,15 @@ import aniso8601
 
 log = logging.getLogger(__name__)
 
+# Processing parameters for the sample CSVs, whose QA is already unpacked
+csv_params = {'QA_BITPACKED': False,
+              'QA_FILL': 255,
+              'QA_CLEAR': 0,
+              'QA_WATER': 1,
+              'QA_SHADOW': 2,
+              'QA_SNOW': 3,
+              'QA_CLOUD': 4}
+
 
 def two_change_data():
     """ Generate sample data that has two changes in it.  The qa data is not
@@ -4,8 +4,9 @@ Tests for running ccd from the top level __init__.py/detect()
 Sanity checks to make sure test data sets run to completion
 """
 import numpy as np
+import pytest
 
-from test.shared import read_data
+from test.shared import csv_params, read_data
 # from shared import two_change_data
 #
 import ccd
@@ -25,19 +26,11 @@ def test_sample_data_sets():
                'test/resources/sample_WA_grid08_row999_col1_normal.csv',
                'test/resources/test_3657_3610_observations.csv']
 
-    params = {'QA_BITPACKED': False,
-              'QA_FILL': 255,
-              'QA_CLEAR': 0,
-              'QA_WATER': 1,
-              'QA_SHADOW': 2,
-              'QA_SNOW': 3,
-              'QA_CLOUD': 4}
-
     for sample in samples:
         data = read_data(sample)
         results = ccd.detect(data[0], data[1], data[2], data[3], data[4],
-                             data[5], data[6], data[7], data[8],
-                             params=params)
+                             data[5], data[6], data[7], qas=data[8],
+                             params=csv_params)
 
 
 def test_npy():
@@ -126,3 +119,123 @@ def test_variogramfailure():
     assert ans_changemodels == res['change_models']
     assert ans_processmask == res['processing_mask']
 
+
+def test_detect_block():
+    """
+    Make sure the block entry point gives the same results as running each
+    pixel through detect on its own.
+    """
+    data = read_data('test/resources/test_3657_3610_observations.csv')
+    dates, qas = data[0], data[8]
+
+    # Reflective and thermal bands, the indices are derived
+    spectra = data[1:8]
+
+    # Second pixel is shifted so the two pixels are not identical
+    spectra_cube = np.stack((spectra, spectra + 100), axis=-1)
+    qas_cube = np.stack((qas, qas), axis=-1)
+
+    results = ccd.detect_block(dates, spectra_cube, qas_cube,
+                               params=csv_params)
+
+    assert len(results) == 2
+
+    for px, result in enumerate(results):
+        single = ccd.detect(dates, *spectra_cube[:, :, px],
+                            qas=qas_cube[:, px], params=csv_params)
+
+        assert result == single
+
+
+def test_detection_only():
+    """
+    Only fitting the detection bands during the break search should find the
+    same segments, with the same models for every band.
+    """
+    data = read_data('test/resources/test_3657_3610_observations.csv')
+    dates, qas = data[0], data[8]
+
+    indices = np.random.RandomState(0).normal(0, 100, (7, dates.shape[0]))
+    spectra = np.vstack((data[1:8], indices))[:, :, None]
+
+    full = ccd.detect_block(dates, spectra, qas[:, None], params=dict(
+        csv_params, FIT_DETECTION_ONLY=False))[0]
+    fast = ccd.detect_block(dates, spectra, qas[:, None], params=dict(
+        csv_params, FIT_DETECTION_ONLY=True))[0]
+
+    assert len(fast['change_models']) == len(full['change_models'])
+
+    for seg_fast, seg_full in zip(fast['change_models'],
+                                  full['change_models']):
+        for key in ('start_day', 'end_day', 'break_day', 'curve_qa'):
+            assert seg_fast[key] == seg_full[key]
+
+        for band in ('blue', 'swir1', 'thermal', 'nbr', 'wetness'):
+            assert np.allclose(seg_fast[band]['coefficients'],
+                               seg_full[band]['coefficients'])
+            assert np.isclose(seg_fast[band]['magnitude'],
+                              seg_full[band]['magnitude'])
+
+
+def test_detect_array():
+    """
+    Stacked spectra, including strided views into a larger cube, are used
+    as given and left untouched.
+    """
+    data = read_data('test/resources/test_3657_3610_observations.csv')
+    order = np.argsort(data[0], kind='stable')
+    dates, spectra, qas = data[0][order], data[1:8][:, order], data[8][order]
+
+    cube = np.stack((spectra, spectra + 100), axis=-1)
+    original = cube.copy()
+
+    result = ccd.detect_array(dates, cube[:, :, 0], qas, params=csv_params)
+
+    assert np.array_equal(cube, original)
+    assert result == ccd.detect(dates, *spectra, qas=qas, params=csv_params)
+
+    # Out of order dates still get sorted
+    shuffle = np.random.RandomState(0).permutation(dates.shape[0])
+    shuffled = ccd.detect_array(dates[shuffle], cube[:, shuffle, 0],
+                                qas[shuffle], params=csv_params)
+
+    assert shuffled['change_models'] == result['change_models']
+
+
+def test_detect_positional_indices():
+    """
+    The index bands given by position before the qas, as they always have
+    been, map to the same bands as when given by keyword.
+    """
+    data = read_data('test/resources/test_3657_3610_observations.csv')
+    dates, spectra, qas = data[0], data[1:8], data[8]
+    derived = np.random.RandomState(0).normal(0, 100, (7, dates.shape[0]))
+
+    names = ('nbrs', 'ndvis', 'evis', 'evi2s', 'brightnesss', 'greennesss',
+             'wetnesss')
+    ans = ccd.detect(dates, *spectra, qas=qas, params=csv_params,
+                     **dict(zip(names, derived)))
+
+    assert ans == ccd.detect(dates, *spectra, *derived, qas, None, csv_params)
+    assert ans == ccd.detect(dates, *spectra, *derived, qas, params=csv_params)
+
+    # Without the index bands, qas can not be given by position
+    with pytest.raises(TypeError):
+        ccd.detect(dates, *spectra, qas, params=csv_params)
+
+    with pytest.raises(ValueError):
+        ccd.detect(dates, *spectra, *derived[:3], qas=qas, params=csv_params)
+
+
+def test_custom_fitter():
+    """
+    A FITTER_FN path to a function that is not registered is called one band
+    at a time.
+    """
+    data = read_data('test/resources/test_3657_3610_observations.csv')
+    custom = ccd.detect(*data[:8], qas=data[8], params=dict(
+        csv_params, FITTER_FN='test.test_models.per_band_fitter'))
+    ans = ccd.detect(*data[:8], qas=data[8],
+                     params=dict(csv_params, FITTER_FN='sklearn'))
+
+    assert custom['change_models'] == ans['change_models']
@@ -1,4 +1,6 @@
 from ccd.change import *
+from ccd.models import lasso
+from ccd.models import stack_models
 
 
 def test_adjustpeek():
@@ -31,3 +33,84 @@ def test_adjustpeek():
     defpeek = 6
     ans = 6
     assert ans == adjustpeek(test_dates, defpeek)
+
+
+def test_stable():
+    dates = np.arange(0, 16 * 30, 16) + 730000
+    observations = np.random.RandomState(0).normal(1000, 20, size=(7, 30))
+    variogram = np.full(7, 20.0)
+    detection_bands = [1, 2, 3, 4, 5]
+
+    models = lasso.fitted_models(dates, observations, 1000, 365.2425, 4)
+
+    # The original per band loop
+    check_vals = []
+    for idx in detection_bands:
+        rmse_norm = max(variogram[idx], models[idx].rmse)
+        slope = models[idx].fitted_model.coef_[0] * (dates[-1] - dates[0])
+        ends = np.abs(models[idx].residual[[0, -1]])
+        check_vals.append((abs(slope) + ends[0] + ends[1]) / rmse_norm)
+    norm = np.sum(np.array(check_vals) ** 2)
+
+    assert stable(models, dates, variogram, norm + 1, detection_bands)
+    assert not stable(models, dates, variogram, norm - 1, detection_bands)
+
+    # Stacked models give the same answer
+    stacked = stack_models(models)
+    assert stable(stacked, dates, variogram, norm + 1, detection_bands)
+    assert not stable(stacked, dates, variogram, norm - 1, detection_bands)
+
+
+def test_calc_residuals():
+    dates = np.arange(0, 16 * 30, 16) + 730000
+    observations = np.random.RandomState(0).normal(1000, 20, size=(7, 30))
+    avg_days_yr = 365.2425
+
+    models = lasso.fitted_models(dates[:24], observations[:, :24], 1000,
+                                 avg_days_yr, 4)
+
+    # All bands at once match each band on its own
+    residuals = calc_residuals(dates[24:], observations[:, 24:], models,
+                               avg_days_yr)
+
+    assert residuals.shape == (7, 6)
+    for idx in range(7):
+        assert np.allclose(residuals[idx],
+                           calc_residuals(dates[24:], observations[idx, 24:],
+                                          models[idx], avg_days_yr))
+
+
+def test_masked_observations():
+    dates = np.arange(20) + 730000
+    observations = np.arange(60).reshape(3, 20) * 1.0
+    mask = np.ones(20, dtype=bool)
+    mask[[2, 7]] = False
+
+    masked = MaskedObservations(dates, observations, mask)
+    assert masked.count == 18
+
+    # Same as applying the mask to the full series each time
+    masked.remove(5)
+    mask = update_processing_mask(mask.copy(), 5)
+
+    outliers = np.zeros(6, dtype=bool)
+    outliers[[1, 4]] = True
+    masked.remove(outliers, slice(8, 14))
+    mask = update_processing_mask(mask.copy(), outliers, slice(8, 14))
+
+    assert masked.count == np.sum(mask)
+    assert np.array_equal(masked.mask, mask)
+    assert masked.pending == 3
+    assert np.array_equal(masked.period, dates[mask])
+    assert np.array_equal(masked.spectra, observations[:, mask])
+    assert masked.pending == 0
+
+    # Removals since the buffers were last read are compacted together
+    masked.remove(-1)
+    masked.remove(0)
+    mask = update_processing_mask(mask.copy(), -1)
+    mask = update_processing_mask(mask.copy(), 0)
+
+    assert masked.pending == 2
+    assert np.array_equal(masked.period, dates[mask])
+    assert np.array_equal(masked.spectra, observations[:, mask])
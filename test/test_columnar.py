@@ -0,0 +1,93 @@
+"""
+Tests for the columnar results in ccd.columnar
+"""
+import numpy as np
+import pytest
+
+from test.shared import csv_params, read_data
+
+import ccd
+from ccd import columnar
+from ccd.models import SEGMENT_DTYPE
+
+
+samples = ['test/resources/test_3657_3610_observations.csv',
+           'test/resources/sample_WA_grid08_row9_col2267_persistent_snow.csv',
+           'test/resources/sample_WA_grid08_row12_col2265_fmask_fail.csv']
+
+
+def detect(data, columns):
+    return ccd.detect(*data[:8], qas=data[8],
+                      params=dict(csv_params, COLUMNAR_RESULTS=columns))
+
+
+def test_columnar_results():
+    for sample in samples:
+        data = read_data(sample)
+        ans = detect(data, False)
+        results = detect(data, True)
+
+        assert results['change_models'].dtype == SEGMENT_DTYPE
+        assert results['processing_mask'].dtype == bool
+        mask = [bool(m) for m in ans['processing_mask']]
+        assert list(results['processing_mask']) == mask
+
+        models = columnar.changemodels(results['change_models'])
+        assert len(models) == len(ans['change_models'])
+        for model, expected in zip(models, ans['change_models']):
+            for key, value in expected.items():
+                if isinstance(value, dict):
+                    coefficients = value['coefficients']
+                    assert np.allclose(
+                        model[key]['coefficients'][:len(coefficients)],
+                        coefficients)
+                    assert model[key]['rmse'] == value['rmse']
+                    assert model[key]['magnitude'] == value['magnitude']
+                else:
+                    assert model[key] == value
+
+        converted = columnar.segments(ans['change_models'])
+        assert np.array_equal(converted, results['change_models'])
+
+
+def test_result_table():
+    data = read_data(samples[0])
+    ans = detect(data, False)
+    results = detect(data, True)
+
+    table = columnar.ResultTable(capacity=1)
+    table.extend([(10, ans), (11, {'algorithm': ans['algorithm'],
+                                   'processing_mask': ans['processing_mask'],
+                                   'change_models': [],
+                                   'cloud_prob': 0, 'snow_prob': 0,
+                                   'water_prob': 0}),
+                  (12, results)])
+
+    count = len(ans['change_models'])
+    assert len(table) == 3
+    assert list(table.pixels['segment_count']) == [count, 0, count]
+    assert list(table.segments['pixel']) == [10] * count + [12] * count
+    assert table.processing_masks.shape == (3, data.shape[1])
+    assert np.array_equal(table.processing_masks[2],
+                          results['processing_mask'])
+
+    row = table.results(2)
+    assert np.array_equal(row['change_models'], results['change_models'])
+    assert row['cloud_prob'] == results['cloud_prob']
+
+    with pytest.raises(ValueError):
+        table.append(13, dict(results, processing_mask=[1, 0]))
+
+
+def test_columnar_prev_results():
+    data = read_data(samples[0])
+    half = data[:, :data.shape[1] - 200]
+
+    ans = ccd.detect(*data[:8], qas=data[8],
+                     prev_results=detect(half, False), params=csv_params)
+    results = ccd.detect(*data[:8], qas=data[8],
+                         prev_results=detect(half, True),
+                         params=dict(csv_params, COLUMNAR_RESULTS=True))
+
+    assert columnar.changemodels(results['change_models']) == \
+        columnar.changemodels(columnar.segments(ans['change_models']))
@@ -0,0 +1,84 @@
+"""
+Tests for the derived index bands in ccd.indices
+"""
+import numpy as np
+
+from test.shared import csv_params, read_data
+
+import ccd
+from ccd import indices
+
+params = ccd.app.get_default_params()
+
+
+def test_derive():
+    # blue, green, red, nir, swir1, swir2, thermal
+    observations = np.array([[500, 800, 600, 3000, 2000, 1000, 2900]]).T
+
+    derived = indices.derive(observations, params)
+
+    assert derived.shape == (indices.INDEX_COUNT, 1)
+    assert np.isclose(derived[0, 0], 10000 * 2000 / 4000)
+    assert np.isclose(derived[1, 0], 10000 * 2400 / 3600)
+    assert np.isclose(derived[2, 0], 10000 * 2.5 * 2400 / 12850)
+    assert np.isclose(derived[3, 0], 10000 * 2.5 * 2400 / 14440)
+    assert np.allclose(derived[4:, 0],
+                       indices.TASSELED_CAP.dot(observations[:6, 0]))
+
+
+def test_derive_saturated():
+    """
+    Saturated or zeroed out observations give zeros rather than nan.
+    """
+    observations = np.array([[20000, 20000, 20000, 20000, 1500, 1200, 2700],
+                             [0, 0, 0, 0, 0, 0, 2700]]).T
+
+    derived = indices.derive(observations, params)
+
+    assert np.isfinite(derived).all()
+    assert derived[2, 0] == 0
+    assert not derived[:4, 1].any()
+
+
+def test_append_indices():
+    data = read_data('test/resources/sample_WA_grid08_row999_col1_normal.csv')
+    observations = data[1:8]
+    mask = np.zeros(observations.shape[1], dtype=bool)
+    mask[::3] = True
+
+    spectra = indices.append_indices(observations, mask, params)
+
+    assert spectra.shape == (14, observations.shape[1])
+    assert np.array_equal(spectra[:7], observations)
+    assert np.allclose(spectra[7:, mask],
+                       indices.derive(observations[:, mask], params),
+                       equal_nan=True)
+    assert not spectra[7:, ~mask].any()
+
+    # Already has the index bands
+    assert indices.append_indices(spectra, mask, params) is spectra
+
+
+def test_detect_derived():
+    """
+    Deriving the indices inside of detect matches handing them in.
+    """
+    data = read_data('test/resources/test_3657_3610_observations.csv')
+    derived = indices.derive(data[1:8], params)
+
+    names = ('nbrs', 'ndvis', 'evis', 'evi2s', 'brightnesss', 'greennesss',
+             'wetnesss')
+
+    lazy = ccd.detect(*data[:8], qas=data[8], params=csv_params)
+    given = ccd.detect(*data[:8], qas=data[8], params=csv_params,
+                       **dict(zip(names, derived)))
+
+    assert len(lazy['change_models']) == len(given['change_models'])
+
+    for lazy_model, given_model in zip(lazy['change_models'],
+                                       given['change_models']):
+        assert lazy_model['break_day'] == given_model['break_day']
+        assert np.allclose(lazy_model['ndvi']['coefficients'],
+                           given_model['ndvi']['coefficients'])
+        assert np.isclose(lazy_model['wetness']['rmse'],
+                          given_model['wetness']['rmse'])
@@ -117,3 +117,18 @@ def test_adjusted_variogram():
     test_dates = np.arange(16, step=16)
     # ans = np.array([np.nan])
     assert all(np.isnan(adjusted_variogram(test_dates, test_obs)))
+
+
+def test_variogram_lag():
+    # Single Landsat sensor spacing
+    assert variogram_lag(np.arange(16 * 10, step=16)) == 2
+
+    # Daily observations
+    assert variogram_lag(np.arange(100)) == 31
+
+    # Ties go to the smaller gap, like the mode
+    assert variogram_lag(np.array([0, 10, 50, 60, 100])) == 2
+
+    # Not enough time
+    assert variogram_lag(np.arange(10)) is None
+    assert variogram_lag(np.array([])) is None
@@ -0,0 +1,82 @@
+"""
+Tests for the opt-in instrumentation in ccd.metrics
+"""
+import numpy as np
+
+from test.shared import csv_params, read_data
+
+import ccd
+from ccd import metrics
+
+
+def test_collector():
+    assert metrics.collector(None) is metrics.NULL
+    assert metrics.collector(False) is metrics.NULL
+    assert type(metrics.collector(True)) is metrics.Metrics
+
+    collector = metrics.Metrics()
+    assert metrics.collector(collector) is collector
+
+    with collector.timer('stage'):
+        collector.count('events')
+        collector.count('events', 2)
+
+    assert collector.as_dict()['counts'] == {'events': 3}
+    assert collector.as_dict()['times']['stage'] >= 0
+
+    # Nothing is recorded when turned off
+    with metrics.NULL.timer('stage'):
+        metrics.NULL.count('events')
+
+    assert metrics.NULL.as_dict() == {'times': {}, 'counts': {}}
+
+
+def test_detect_metrics():
+    """
+    Metrics are only reported when asked for, and do not change the results.
+    """
+    data = read_data('test/resources/test_3657_3610_observations.csv')
+    dates, spectra, qas = data[0], data[1:8], data[8]
+
+    plain = ccd.detect(dates, *spectra, qas=qas, params=csv_params)
+    result = ccd.detect(dates, *spectra, qas=qas,
+                        params=dict(csv_params, METRICS=True))
+    reported = result.pop('metrics')
+
+    assert 'metrics' not in plain
+    assert result == plain
+
+    for stage in ('filter', 'variogram', 'initialize', 'lookforward',
+                  'detect'):
+        assert reported['times'][stage] > 0
+
+    assert reported['counts']['fits'] >= len(result['change_models'])
+    assert reported['counts']['tmask_fits'] > 0
+    assert reported['counts']['fit_iterations'] >= reported['counts']['fits']
+
+    # Warm starts save sweeps, and the same segments are found
+    cold = ccd.detect(dates, *spectra, qas=qas,
+                      params=dict(csv_params, METRICS=True,
+                                  FIT_WARM_START=False))
+    warm = reported['counts']['fit_iterations']
+    assert warm < cold['metrics']['counts']['fit_iterations']
+    assert cold['metrics']['counts']['fits'] == reported['counts']['fits']
+
+    # A supplied collector accumulates across calls, and across the pixels
+    # of a block
+    collector = metrics.Metrics()
+    ccd.detect(dates, *spectra, qas=qas,
+               params=dict(csv_params, METRICS=collector))
+    assert collector.counts == reported['counts']
+
+    spectra_cube = np.stack((spectra, spectra), axis=-1)
+    qas_cube = np.stack((qas, qas), axis=-1)
+
+    ccd.detect_block(dates, spectra_cube, qas_cube,
+                     params=dict(csv_params, METRICS=collector))
+    assert collector.counts == {name: 3 * count for name, count
+                                in reported['counts'].items()}
+
+    block = ccd.detect_block(dates, spectra_cube, qas_cube,
+                             params=dict(csv_params, METRICS=True))
+    assert [r['metrics']['counts'] for r in block] == [reported['counts']] * 2
@@ -3,10 +3,12 @@ Tests for any methods that reside in the ccd.models sub-module.
 """
 
 import numpy as np
+import pytest
 
 from test.shared import read_data
 
 from ccd import models
+from ccd.models import fitters
 
 
 def test_lasso_coefficient_matrix():
@@ -37,3 +39,334 @@ def test_lasso_coefficient_matrix():
         if unused_cols.shape[1] > 0:
             assert (np.where(unused_cols == 0)[0].size / unused_cols.shape[1])\
                    == len(dates)
+
+
+def test_lasso_fitted_models():
+    """
+    The multi-band fitter should reproduce the per-band sklearn fits.
+    """
+    sample = 'test/resources/test_3657_3610_observations.csv'
+    avg_days_yr = 365.2425
+    max_iter = 1000
+
+    data = read_data(sample)
+    clear = data[8] < 2
+    dates = data[0][clear]
+    spectra = data[1:8][:, clear]
+
+    for num_obs, num_coefs in ((12, 4), (24, 6), (60, 8)):
+        period = dates[:num_obs]
+        obs = spectra[:, :num_obs]
+
+        fits = models.lasso.fitted_models(period, obs, max_iter, avg_days_yr,
+                                          num_coefs)
+
+        assert len(fits) == obs.shape[0]
+
+        for fit, spectrum in zip(fits, obs):
+            ans = models.lasso.fitted_model(period, spectrum, max_iter,
+                                            avg_days_yr, num_coefs)
+
+            assert fit.fitted_model.n_iter_ == ans.fitted_model.n_iter_
+            assert np.allclose(fit.fitted_model.coef_, ans.fitted_model.coef_)
+            assert np.isclose(fit.fitted_model.intercept_,
+                              ans.fitted_model.intercept_)
+            assert np.isclose(fit.rmse, ans.rmse)
+            assert np.allclose(fit.residual, ans.residual)
+
+
+def test_lasso_incremental():
+    """
+    Growing the running sums should give the same fits as fitting the
+    resulting window directly.
+    """
+    sample = 'test/resources/test_3657_3610_observations.csv'
+    avg_days_yr = 365.2425
+    max_iter = 1000
+
+    data = read_data(sample)
+    clear = data[8] < 2
+    dates = data[0][clear]
+    spectra = data[1:8][:, clear]
+
+    incremental = models.lasso.IncrementalLasso(spectra.shape[0], 60, max_iter,
+                                                avg_days_yr, dates[0])
+    incremental.extend(dates[:30], spectra[:, :30])
+    incremental.extend(dates[30:60], spectra[:, 30:60])
+
+    ans = models.lasso.fitted_models(dates[:60], spectra[:, :60], max_iter,
+                                     avg_days_yr, 8)
+
+    for fit, expected in zip(incremental.fitted_models(8), ans):
+        assert np.allclose(fit.fitted_model.coef_,
+                           expected.fitted_model.coef_)
+        assert np.isclose(fit.fitted_model.intercept_,
+                          expected.fitted_model.intercept_)
+        assert np.isclose(fit.rmse, expected.rmse)
+        assert np.allclose(fit.residual, expected.residual)
+
+
+def test_lasso_warm_start():
+    """
+    Starting from the fit of a slightly smaller window converges to the same
+    models, within the lasso tolerance, in fewer sweeps.
+    """
+    sample = 'test/resources/test_3657_3610_observations.csv'
+    avg_days_yr = 365.2425
+    max_iter = 1000
+
+    data = read_data(sample)
+    clear = data[8] < 2
+    dates = data[0][clear]
+    spectra = data[1:8][:, clear]
+
+    previous = models.lasso.fitted_models(dates[:79], spectra[:, :79],
+                                          max_iter, avg_days_yr, 8)
+    cold = models.lasso.fitted_models(dates[:80], spectra[:, :80],
+                                      max_iter, avg_days_yr, 8)
+    warm = models.lasso.fitted_models(dates[:80], spectra[:, :80],
+                                      max_iter, avg_days_yr, 8,
+                                      warm_start=previous.coefficients)
+
+    assert np.allclose(warm.residuals, cold.residuals, atol=1)
+    assert np.allclose(warm.rmse, cold.rmse, rtol=1e-4)
+    assert warm.n_iter.sum() < cold.n_iter.sum()
+
+    incremental = models.lasso.IncrementalLasso(spectra.shape[0], 80, max_iter,
+                                                avg_days_yr, dates[0],
+                                                warm_start=True)
+    incremental.extend(dates[:79], spectra[:, :79])
+    incremental.fitted_models(8)
+    incremental.extend(dates[79:80], spectra[:, 79:80])
+    fit = incremental.fitted_models(8)
+
+    assert np.allclose(fit.residuals, cold.residuals, atol=1)
+    assert fit.n_iter.sum() < cold.n_iter.sum()
+
+
+def test_lasso_design_cache():
+    sample = 'test/resources/sample_WA_grid08_row999_col1_normal.csv'
+    avg_days_yr = 365.25
+
+    dates = read_data(sample)[0]
+
+    # Room for the full series and a little more
+    maxbytes = (dates.shape[0] + 30) * 7 * 8
+    cache = models.lasso.DesignMatrixCache(maxbytes=maxbytes)
+
+    for coefs in (4, 6, 8):
+        matrix = cache.matrix(dates, avg_days_yr, coefs)
+        ans = models.lasso.coefficient_matrix(dates, avg_days_yr, coefs)
+
+        assert matrix.shape == (dates.shape[0], coefs - 1)
+        assert np.array_equal(matrix, ans[:, :coefs - 1])
+
+    # Built once, then sliced for each number of coefficients
+    assert cache.info()['misses'] == 1
+    assert cache.info()['hits'] == 2
+
+    # Least recently used matrices are evicted to stay within the bytes
+    cache.matrix(dates[:10], avg_days_yr)
+    cache.matrix(dates[:25], avg_days_yr)
+
+    assert cache.info()['size'] == 2
+    assert cache.info()['nbytes'] == 35 * 7 * 8
+
+    cache.matrix(dates, avg_days_yr)
+    assert cache.info()['misses'] == 4
+    assert cache.info()['nbytes'] <= maxbytes
+
+    # Larger than the whole cache, built but not kept
+    cache.matrix(np.arange(dates.shape[0] + 31) + 730000.0, avg_days_yr)
+    assert cache.info()['nbytes'] <= maxbytes
+
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'size': 0, 'nbytes': 0,
+                            'maxbytes': maxbytes}
+
+
+def per_band_fitter(dates, spectra_obs, max_iter, avg_days_yr,
+                    num_coefficients):
+    """
+    Custom fitter taking one band at a time, given to FITTER_FN by its path.
+    """
+    assert spectra_obs.ndim == 1
+
+    return models.lasso.fitted_model(dates, spectra_obs, max_iter, avg_days_yr,
+                                     num_coefficients)
+
+
+def test_fitters():
+    """
+    Registered engines resolve by name or path, and every engine fits all of
+    the bands, whether it takes them at once or one at a time.
+    """
+    sample = 'test/resources/test_3657_3610_observations.csv'
+    avg_days_yr = 365.2425
+    max_iter = 1000
+
+    data = read_data(sample)
+    clear = data[8] < 2
+    dates = data[0][clear][:60]
+    spectra = data[1:8][:, clear][:, :60]
+
+    assert fitters.resolve('lasso') is fitters.FITTERS['lasso']
+    assert (fitters.resolve('ccd.models.lasso.fitted_models') is
+            fitters.FITTERS['lasso'])
+    assert fitters.resolve('ccd.models.ridge.fitted_models').name == 'ridge'
+    assert not fitters.resolve('sklearn').batched
+
+    with pytest.raises(ValueError):
+        fitters.resolve('ccd.models.lasso.no_such_fitter')
+
+    native = fitters.resolve('lasso')(dates, spectra, max_iter, avg_days_yr, 8)
+    sklearn = fitters.resolve('sklearn')(dates, spectra, max_iter,
+                                         avg_days_yr, 8)
+
+    assert isinstance(sklearn, models.BandModels)
+    assert np.allclose(sklearn.coefficients, native.coefficients)
+
+    # Functions that are not registered are called one band at a time
+    custom = fitters.resolve('test.test_models.per_band_fitter')
+    assert not custom.batched
+    assert custom.fn is per_band_fitter
+
+    fitted = custom(dates, spectra, max_iter, avg_days_yr, 8)
+    assert np.allclose(fitted.coefficients, sklearn.coefficients)
+    assert np.allclose(fitted.rmse, sklearn.rmse)
+    assert np.allclose(sklearn.intercepts, native.intercepts)
+    assert np.allclose(sklearn.rmse, native.rmse)
+
+    # Ridge as least squares over the centered design, with the penalty
+    # added as extra rows
+    ridge = fitters.resolve('ridge')(dates, spectra, max_iter, avg_days_yr, 8)
+    design = models.lasso.coefficient_matrix(dates, avg_days_yr, 8)
+    design = design - design.mean(axis=0)
+    penalty = np.sqrt(models.ridge.RIDGE_ALPHA * 60) * np.eye(7)
+    centered = spectra - spectra.mean(axis=1)[:, None]
+    ans = np.linalg.lstsq(np.vstack((design, penalty)),
+                          np.hstack((centered, np.zeros((7, 7)))).T,
+                          rcond=None)[0]
+
+    assert np.allclose(ridge.coefficients, ans.T)
+    assert np.allclose(ridge.residuals, centered - design.dot(ans).T)
+    assert np.all(ridge.rmse <= native.rmse + 1e-6)
+
+
+def test_band_models():
+    sample = 'test/resources/sample_WA_grid08_row999_col1_normal.csv'
+    avg_days_yr = 365.25
+
+    data = read_data(sample)
+    dates = data[0][:40]
+    spectra = data[1:8][:, :40]
+
+    fits = models.lasso.fitted_models(dates, spectra, 1000, avg_days_yr, 6)
+
+    assert len(fits) == spectra.shape[0]
+    assert fits.coefficients.shape == (spectra.shape[0], 7)
+    assert models.stack_models(fits) is fits
+
+    # Predicting all the bands at once matches each band on its own
+    predictions = models.lasso.predict(fits, dates, avg_days_yr)
+    assert predictions.shape == spectra.shape
+    assert np.allclose(spectra - predictions, fits.residuals)
+
+    for idx, fit in enumerate(fits):
+        assert fit.rmse == fits.rmse[idx]
+        assert np.allclose(models.lasso.predict(fit, dates, avg_days_yr),
+                           predictions[idx])
+
+    stacked = models.stack_models(list(fits))
+    assert np.array_equal(stacked.coefficients, fits.coefficients)
+    assert np.array_equal(stacked.residuals, fits.residuals)
+
+
+def test_multi_rlm():
+    """
+    Fitting all of the Tmask bands together gives the same fits as the
+    single band RLM.
+    """
+    sample = 'test/resources/test_3657_3610_observations.csv'
+    avg_days_yr = 365.2425
+
+    data = read_data(sample)
+    clear = data[8] < 2
+    dates = data[0][clear][:40]
+    spectra = data[1:8][:, clear][:, :40]
+
+    matrix = models.tmask.tmask_coefficient_matrix(dates, avg_days_yr)
+
+    fit = models.robust_fit.MultiRLM(maxiter=5).fit(matrix, spectra)
+    predicted = fit.predict(matrix)
+
+    for band in range(spectra.shape[0]):
+        single = models.robust_fit.RLM(maxiter=5).fit(matrix, spectra[band])
+
+        assert np.allclose(fit.coef_[band], single.coef_)
+        assert np.allclose(predicted[band], single.predict(matrix))
+
+
+def test_rlm_kernel():
+    """
+    The IRLS kernel, compiled when Numba is available, matches the generic
+    RLM loop on the bundled pixels.
+    """
+    samples = ['test/resources/h03v09_-2010765_1964625_pixel.npy',
+               'test/resources/h04v03_-1945125_2844645_pixel_endfit.npy',
+               'test/resources/h04v03_-1945155_2844645_pixel_startfit.npy']
+    avg_days_yr = 365.2425
+
+    def generic(resid, c):
+        return models.robust_fit.bisquare(resid, c=c)
+
+    for sample in samples:
+        pixel = dict(np.load(sample, allow_pickle=True)[1])
+        dates = np.asarray(pixel['dates'])
+        order = np.argsort(dates)
+        dates = dates[order]
+        spectra = np.stack((pixel['greens'], pixel['swir1s']))[:, order]
+
+        # Windows covering more than a year, as Tmask sees them
+        for start in range(0, dates.shape[0] // 2, 400):
+            stop = np.searchsorted(dates, dates[start] + 400)
+            window = slice(start, stop)
+            matrix = models.tmask.tmask_coefficient_matrix(dates[window],
+                                                           avg_days_yr)
+
+            multi = models.robust_fit.MultiRLM(maxiter=5).fit(
+                matrix, spectra[:, window])
+
+            for band in range(spectra.shape[0]):
+                kernel = models.robust_fit.RLM(maxiter=5).fit(
+                    matrix, spectra[band, window])
+                loop = models.robust_fit.RLM(maxiter=5, M=generic).fit(
+                    matrix, spectra[band, window])
+
+                assert np.allclose(kernel.coef_, loop.coef_)
+                assert np.isclose(kernel.scale, loop.scale)
+                assert np.allclose(multi.coef_[band], loop.coef_)
+
+
+def test_mad():
+    """
+    Selecting the middle order statistics gives exactly the sort based
+    median absolute deviation, for odd and even lengths and for every row.
+    """
+    def sorted_mad(x, c=0.6745):
+        return np.median(np.sort(np.abs(x))[4:]) / c
+
+    rng = np.random.RandomState(42)
+
+    for count in range(5, 45):
+        resid = rng.normal(scale=100, size=(3, count))
+        resid[1] = np.round(resid[1] / 10)
+
+        rows = models.robust_fit.mad_rows(resid)
+
+        for row in range(resid.shape[0]):
+            assert models.robust_fit.mad(resid[row]) == sorted_mad(resid[row])
+            assert rows[row] == sorted_mad(resid[row])
+
+    assert np.isnan(models.robust_fit.mad(np.ones(4)))
+    assert np.all(np.isnan(models.robust_fit.mad_rows(np.ones((2, 4)))))
@@ -0,0 +1,35 @@
+"""
+Tests for the process pool runner in ccd.parallel
+"""
+import numpy as np
+
+from test.shared import csv_params, read_data
+
+import ccd
+from ccd import parallel
+
+
+def test_chunk_slices():
+    ans = [slice(0, 4), slice(4, 8), slice(8, 10)]
+
+    assert ans == parallel.chunk_slices(10, 4)
+
+
+def test_detect_tile():
+    data = read_data('test/resources/test_3657_3610_observations.csv')
+    dates, qas = data[0], data[8]
+
+    spectra = np.vstack((data[1:8], np.zeros((7, dates.shape[0]))))
+    spectra_cube = np.stack((spectra, spectra + 100, spectra + 200), axis=-1)
+    qas_cube = np.stack((qas, qas, qas), axis=-1)
+
+    ans = ccd.detect_block(dates, spectra_cube, qas_cube, params=csv_params)
+
+    results = dict(parallel.detect_tile(dates, spectra_cube, qas_cube,
+                                        params=csv_params, chunk_size=2,
+                                        workers=2))
+
+    assert sorted(results) == [0, 1, 2]
+
+    for px in results:
+        assert results[px] == ans[px]
@@ -1,6 +1,8 @@
 """
 Tests for the basic masking and filtering operations
 """
+import pytest
+
 from ccd.qa import *
 from ccd.app import get_default_params
 
@@ -136,3 +138,53 @@ def test_ratio_cloud():
     ans = 0
 
     assert ans == ratio_cloud(arr, fill, cloud)
+
+
+def test_unpackqa():
+    packints = np.array([1, 2, 4, 8, 16, 32, 832, 896, 1024, 3, 34, 48])
+    ans = np.array([qabitval(i, default_params) for i in packints])
+
+    assert np.array_equal(ans, unpackqa(packints, default_params))
+
+    # 2-d (time, pixels) blocks keep their shape
+    block = packints.reshape(4, 3)
+    assert np.array_equal(ans.reshape(4, 3), unpackqa(block, default_params))
+
+    # Every unsupported value is reported at once
+    with pytest.raises(ValueError) as e:
+        unpackqa([2, 0, 64, 0], default_params)
+    assert '[0, 64]' in str(e.value)
+
+
+def test_unpackqa_lut():
+    packints = np.array([1, 2, 4, 8, 16, 32, 832, 896, 1024, 3, 34, 48],
+                        dtype=np.uint16)
+    ans = unpackqa(packints, default_params)
+
+    assert np.array_equal(ans, unpackqa_lut(packints, default_params))
+    assert np.array_equal(ans.reshape(3, 4),
+                          unpackqa_lut(packints.reshape(3, 4), default_params))
+
+    # The whole table agrees with the scalar hierarchy where it is supported
+    table = qa_lookup_table(default_params)
+    for value in range(0, 2 ** 16, 97):
+        try:
+            assert table[value] == qabitval(value, default_params)
+        except ValueError:
+            assert table[value] == -1
+
+    # Tables are cached per set of QA offsets
+    assert table is qa_lookup_table(default_params)
+
+    # Every unsupported value is reported at once
+    with pytest.raises(ValueError) as e:
+        unpackqa_lut([2, 0, 64, 0], default_params)
+    assert '[0, 64]' in str(e.value)
+
+    # Nothing is truncated or wrapped into the table
+    with pytest.raises(ValueError):
+        unpackqa_lut(packints.astype(float), default_params)
+
+    with pytest.raises(ValueError) as e:
+        unpackqa_lut([2, -1, 2 ** 16 + 2], default_params)
+    assert '[-1, 65538]' in str(e.value)
@@ -0,0 +1,74 @@
+"""
+Tests for the memory mapped chip reader in ccd.reader
+"""
+import mmap
+
+import numpy as np
+import pytest
+
+from test.shared import csv_params, read_data
+
+import ccd
+from ccd import reader
+
+
+def chip():
+    data = read_data('test/resources/test_3657_3610_observations.csv')
+    dates, qas = data[0].astype(np.int64), data[8].astype(np.uint16)
+
+    spectra = np.stack([data[1:8] + 50 * px for px in range(5)], axis=-1)
+    qas = np.stack([qas] * 5, axis=-1)
+
+    return dates, spectra.astype(np.int16), qas
+
+
+def test_open_npy(tmpdir):
+    dates, spectra, qas = chip()
+    np.save(str(tmpdir.join('dates.npy')), dates)
+    np.save(str(tmpdir.join('spectra.npy')), spectra)
+    np.save(str(tmpdir.join('qas.npy')), qas)
+
+    cube = reader.open_npy(str(tmpdir))
+
+    assert len(cube) == 5
+    assert isinstance(cube.spectra.base, mmap.mmap)
+    assert not cube.spectra.flags.writeable
+
+    block_spectra, block_qas = cube.block(slice(1, 3))
+    assert np.shares_memory(block_spectra, cube.spectra)
+    assert np.array_equal(block_spectra, spectra[:, :, 1:3])
+    assert np.array_equal(block_qas, qas[:, 1:3])
+
+    chunks = [chunk for chunk, _, _ in cube.blocks(2, start=1)]
+    assert chunks == [slice(1, 3), slice(3, 5)]
+
+    pixels = list(cube.pixels(chunk_size=2))
+    assert [px for px, _, _ in pixels] == list(range(5))
+    assert np.array_equal(pixels[4][1], spectra[:, :, 4])
+
+    ans = ccd.detect_block(dates, spectra, qas, params=csv_params)
+    results = list(cube.detect(params=csv_params, chunk_size=2))
+
+    assert [px for px, _ in results] == list(range(5))
+    for (_, result), expected in zip(results, ans):
+        assert result['change_models'] == expected['change_models']
+
+
+def test_open_raw(tmpdir):
+    dates, spectra, qas = chip()
+    spectra_path = str(tmpdir.join('spectra.bsq'))
+    qas_path = str(tmpdir.join('qas.bsq'))
+
+    with open(spectra_path, 'wb') as f:
+        f.write(b'\0' * 16)
+        spectra.astype('>i2').tofile(f)
+    qas.tofile(qas_path)
+
+    cube = reader.open_raw(spectra_path, qas_path, dates, dtype='>i2',
+                           offset=16)
+
+    assert np.array_equal(cube.spectra, spectra)
+    assert np.array_equal(cube.pixel(3)[1], qas[:, 3])
+
+    with pytest.raises(ValueError):
+        reader.open_raw(spectra_path, qas_path, dates, offset=18)